@@ -3,10 +3,10 @@ Functions for computing values from plots.
 """
 
 import warnings
+from functools import lru_cache
 from typing import TYPE_CHECKING
 
 import numpy as np
-from scipy.signal import find_peaks
 
 from frheed.utils import snip_lists
 
@@ -16,11 +16,22 @@ if TYPE_CHECKING:
 # Ignore numpy warnings
 np.seterr("ignore")
 
+# Inputs shorter than this are transformed on a single thread (thread startup would dominate)
+_FFT_PARALLEL_MIN = 8192
+
+
+@lru_cache(maxsize=8)
+def _hanning_window(numsamples: int) -> "NDArray[np.float32]":
+    """Return a cached, read-only periodic Hanning window of the given length."""
+    window = np.hanning(numsamples + 1)[:-1].astype(np.float32)
+    window.flags.writeable = False
+    return window
+
 
 def calc_fft(
     x: NDArray[np.float64], y: NDArray[np.float64]
 ) -> tuple[NDArray[np.float64], NDArray[np.float64]] | tuple[None, None]:
-    """Calculate the FFT of a 1D series.
+    """Calculate the FFT of a 1D series. The input arrays are not modified.
 
     Parameters
     ----------
@@ -47,39 +58,81 @@ def calc_fft(
     if any(invalid_data(d) for d in (x, y)):
         return None, None
 
-    # Create evenly-spaced list of sample points
+    # Transform the series as a batch of one
+    freq, psd = calc_ffts(x, np.asarray(y)[np.newaxis])
+    if freq is None or psd is None or np.isnan(psd[0, 0]):
+        return None, None
+
+    # Sometimes the arrays can become different lengths and throw errors
+    freq, psd, *_ = snip_lists(freq, psd[0])
+
+    return (freq, psd)
+
+
+def calc_ffts(
+    x: NDArray[np.float64], ys: NDArray[np.float64]
+) -> tuple[NDArray[np.float64], NDArray[np.float64]] | tuple[None, None]:
+    """Calculate the FFTs of several 1D series sampled at the same x values in one batched
+    transform. The input arrays are not modified.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        X values shared by every series.
+    ys : np.ndarray
+        Y values with shape (number of series, len(x)).
+
+    Returns
+    -------
+    tuple
+        A tuple containing the frequencies and a (number of series, len(frequencies)) array of
+        the PSD of each series. PSD is Power Spectral Density. The row of any series whose PSD
+        can't be computed is all NaN.
+
+    """
     numsamples = len(x)
+    if numsamples == 0 or ys.ndim != 2 or ys.shape[1] != numsamples:
+        return None, None
+
+    # SciPy is imported here since it is slow to import and isn't needed until the first FFT
+    from scipy import fft as sp_fft
+
+    # Create evenly-spaced list of sample points
     samplespacing = (x[-1] - x[0]) / numsamples
 
+    # Zero-pad the transform to the next length with only small prime factors, since lengths with
+    # large prime factors are much slower to transform; padding only interpolates the spectrum
+    nfft = sp_fft.next_fast_len(numsamples, real=True)
+
     # Generate array of frequencies
-    freq = np.fft.rfftfreq(numsamples, d=samplespacing)
+    freq = np.fft.rfftfreq(nfft, d=samplespacing)
 
-    # Convert y to float32 to avoid type conflict error in following operation
-    y_arr = np.array(y, dtype=np.float32)
+    # Copy y to float32; this is the only array written to below
+    y_arr = np.array(ys, dtype=np.float32)
 
     # Remove DC signal from the y-data
-    y_arr -= np.mean(y)
+    y_arr -= np.mean(ys, axis=1, keepdims=True)
 
     # Apply Hanning filter to smooth edge discontinuities
-    window = np.hanning(numsamples + 1)[:-1]
-    if len(y_arr) != len(window):
-        return None, None
-    hann = y_arr * window
-
-    # Calculate real FFT
-    fftdata = np.fft.rfft(hann)
-
-    # Normalize FFT data & catch warnings (RuntimeError) as exceptions
-    with warnings.catch_warnings():
-        warnings.filterwarnings("error")
-        try:
-            psd: np.ndarray = abs(fftdata) ** 2 / (np.abs(hann) ** 2).sum()
-            psd = (psd * 2) ** 0.5
-        except Warning:
-            return None, None
-
-    # Sometimes the arrays can become different lengths and throw errors
-    freq, psd, *_ = snip_lists(freq, psd)
+    hann = np.multiply(y_arr, _hanning_window(numsamples), out=y_arr)
+    hann_power = (hann * hann).sum(axis=1, keepdims=True)
+
+    # Calculate real FFTs of every row at once (the windowed data is scratch, so it can be
+    # overwritten)
+    workers = -1 if hann.size >= _FFT_PARALLEL_MIN else None
+    fftdata = sp_fft.rfft(hann, n=nfft, axis=1, overwrite_x=True, workers=workers)
+
+    # Normalize FFT data; a series with no power left after windowing (e.g. a constant series)
+    # can't be normalized, so its row is NaN instead of failing every other series in the batch
+    with np.errstate(all="ignore"):
+        psd: np.ndarray = np.divide(
+            abs(fftdata) ** 2,
+            hann_power,
+            out=np.full(fftdata.shape, np.nan, dtype=np.float32),
+            where=hann_power > 0,
+        )
+        psd = (psd * 2) ** 0.5
+    psd[~np.isfinite(psd).all(axis=1)] = np.nan
 
     return (freq, psd)
 
@@ -123,6 +176,10 @@ def detect_peaks(
     y: NDArray[np.float64],
     min_freq: float | None = 0.0,
 ) -> list[float] | None:
+    # Imported here since scipy.signal is slow to import; outside the block below so that any
+    # warning raised while importing it isn't turned into an error
+    from scipy.signal import find_peaks
+
     with warnings.catch_warnings():
         warnings.filterwarnings("error")
 
@@ -69,6 +69,20 @@ _GUI_FUNCTIONS = {
 
 _SYSTEM: PySpin.System | None = None
 
+# Number of recent frame times used to calculate the real FPS
+_FPS_WINDOW = 60
+
+# Give up on a frame after this many consecutive incomplete images (e.g. a bandwidth-starved link)
+_MAX_GRAB_FAILURES = 100
+
+# Chunk data fields copied out of an image by get_array(get_chunk=True); each is read with the
+# ChunkData getter of the same name (e.g. GetFrameID)
+_CHUNK_FIELDS = ("FrameID", "Timestamp", "ExposureTime", "Gain", "BlackLevel")
+
+# Deliver only the newest frame in the stream buffer, dropping older ones if frames arrive faster
+# than they are read (the default, "OldestFirst", hands out frames that are increasingly stale)
+_STREAM_BUFFER_HANDLING_MODE = "NewestOnly"
+
 
 def list_cameras() -> PySpin.CameraList:
     """
@@ -84,21 +98,62 @@ def list_cameras() -> PySpin.CameraList:
     return _SYSTEM.GetCameras()
 
 
+def _read_device_string(cam: PySpin.CameraPtr, node_name: str) -> str | None:
+    """Read a string node from a camera's transport layer nodemap, which doesn't need Init()"""
+    node = PySpin.CStringPtr(cam.GetTLDeviceNodeMap().GetNode(node_name))
+    if PySpin.IsAvailable(node) and PySpin.IsReadable(node):
+        return node.GetValue()
+    return None
+
+
+def _set_stream_enum(cam: PySpin.CameraPtr, node_name: str, entry_name: str) -> bool:
+    """Set an enumeration node in a camera's stream nodemap, returning whether it was set"""
+    node = PySpin.CEnumerationPtr(cam.GetTLStreamNodeMap().GetNode(node_name))
+    if not (PySpin.IsAvailable(node) and PySpin.IsWritable(node)):
+        return False
+    entry = node.GetEntryByName(entry_name)
+    if not (PySpin.IsAvailable(entry) and PySpin.IsReadable(entry)):
+        return False
+    node.SetIntValue(entry.GetValue())
+    return True
+
+
+def _chunk_values(chunk: PySpin.ChunkData) -> dict[str, Any]:
+    """Copy the _CHUNK_FIELDS values out of an image's chunk data, skipping disabled chunks"""
+    values = {}
+    for field in _CHUNK_FIELDS:
+        try:
+            values[field] = getattr(chunk, f"Get{field}")()
+        except PySpin.SpinnakerException:
+            # The chunk isn't enabled on the camera
+            continue
+    return values
+
+
 def get_available_cameras() -> dict:
-    """Get available cameras as a dictionary of {source: name}."""
+    """
+    Get available cameras as a dictionary of {source: name}. The names are read from the
+    transport layer device info, so the cameras don't have to be initialized to list them.
+    """
     cams = list_cameras()
-    num_cams = cams.GetSize()
     available = {}
 
-    for src in range(num_cams):
-        try:
-            with FlirCamera(src=src) as cam:
-                if cam.initialized:
-                    available[src] = str(cam)
-                else:
-                    print(f"FLIR camera {src} is not available")
-        except CameraError:
-            print("No FLIR cameras detected")
+    try:
+        for src in range(cams.GetSize()):
+            cam = cams.GetByIndex(src)
+            try:
+                model = _read_device_string(cam, "DeviceModelName") or "Camera"
+                serial = _read_device_string(cam, "DeviceSerialNumber")
+                available[src] = f"FLIR {model} (SN {serial})"
+            except PySpin.SpinnakerException:
+                logging.exception("FLIR camera %s is not available", src)
+            finally:
+                del cam
+    finally:
+        cams.Clear()
+
+    if not available:
+        print("No FLIR cameras detected")
 
     return available
 
@@ -216,7 +271,7 @@ class FlirCamera:
 
         # Other attributes which may be accessed later
         self._running = False
-        self._frame_times: collections.deque[float] = collections.deque()
+        self._frame_times: collections.deque[float] = collections.deque(maxlen=_FPS_WINDOW)
         self._incomplete_image_count = 0
 
     def __getattr__(self, attr: str) -> Any:
@@ -363,10 +418,10 @@ class FlirCamera:
         if len(self._frame_times) <= 1:
             return 0.0
 
-        # Calculate average of all frames
+        # Calculate average FPS of the most recent n frames
         else:
             dt = self._frame_times[-1] - self._frame_times[0]
-            return len(self._frame_times) / max(dt, 1)
+            return (len(self._frame_times) - 1) / dt if dt > 0 else 0.0
 
     @property
     def width(self) -> int:
@@ -423,6 +478,12 @@ class FlirCamera:
             if pit in self._attr_types:
                 self.camera_attributes[name] = self._attr_types[pit](node)
 
+        # Keep the latency to one frame; this must be set before acquisition begins
+        if not _set_stream_enum(
+            self.cam, "StreamBufferHandlingMode", _STREAM_BUFFER_HANDLING_MODE
+        ):
+            logging.warning("Unable to set the stream buffer handling mode of %s", self)
+
         self._initialized = True
 
     def start(self, continuous: bool = True) -> None:
@@ -511,14 +572,12 @@ class FlirCamera:
         if image_ptr.IsIncomplete():
             self._incomplete_image_count += 1
 
-        # Release the image pointer to free memory (I think this reduces performance?)
-        # image_ptr.Release()  # free memory in the camera buffer
-
+        # The image stays in the camera's buffer pool until the caller releases it
         return image_ptr
 
     def get_array(
         self, wait: bool = True, get_chunk: bool = False, complete_frames_only: bool = False
-    ) -> np.ndarray | tuple[np.ndarray, PySpin.PySpin.ChunkData]:
+    ) -> np.ndarray | tuple[np.ndarray, dict[str, Any]] | None:
         """
         Get an image from the camera, and convert it to a numpy array.
 
@@ -528,35 +587,43 @@ class FlirCamera:
             If True, waits for the next image.  Otherwise throws an exception
             if there isn"t one ready.
         get_chunk : bool (default: False)
-            If True, returns chunk data from image frame.
+            If True, also returns the image's chunk data values as a dict keyed by the
+            _CHUNK_FIELDS names (e.g. "FrameID", "Timestamp"), since the image's
+            ChunkData is only valid until the image is released.
         complete_frames_only : bool (default: True)
             If True, only return complete frames.
 
         Returns
         -------
         img : numpy.ndarray
-        chunk : PySpin.PySpin.ChunkData (only if get_chunk == True)
+        chunk : dict[str, Any] (only if get_chunk == True)
+        None if only complete frames were requested but none arrived after a number of tries.
         """
 
-        # Get image pointer
+        # Get image pointers until one is complete, if that option is chosen, releasing the
+        # incomplete images back to the buffer pool
         img = self.get_image(wait=wait)
-
-        # Ensure complete image is returned if option is chosen
-        if complete_frames_only and img.IsIncomplete():
-            return self.get_array(wait, get_chunk, complete_frames_only)
+        failures = 0
+        while complete_frames_only and img.IsIncomplete():
+            img.Release()
+            failures += 1
+            if failures >= _MAX_GRAB_FAILURES:
+                return None
+            img = self.get_image(wait=wait)
 
         # Store frame time for real FPS calculation
         self._frame_times.append(time.time())
 
-        # Remove the oldest frame if there are more than 60
-        if len(self._frame_times) > 3600:
-            self._frame_times.popleft()
-
-        arr: np.ndarray = img.GetNDArray()
+        # GetNDArray() shares the image's buffer, so copy it out before releasing the image;
+        # otherwise the buffer is never returned to the pool and acquisition eventually stalls
+        arr: np.ndarray = img.GetNDArray().copy()
         if get_chunk:
-            chunk: PySpin.PySpin.ChunkData = img.GetChunkData()
+            # The chunk data is read from the image, so copy its values out before releasing it
+            chunk = _chunk_values(img.GetChunkData())
+            img.Release()
             return (arr, chunk)
         else:
+            img.Release()
             return arr
 
     def get_info(self, name: str) -> dict[str, Any]:
@@ -20,10 +20,89 @@ from frheed.cameras import CameraError
 # https://stackoverflow.com/a/54585850/10342097
 os.environ["OPENCV_VIDEOIO_PRIORITY_MSMF"] = "0"
 
-# Get non-platform-specific capture properties (0 < id < 50)
-_CAP_PROPS = [
-    prop for prop in dir(cv2) if prop.startswith("CAP_PROP") and getattr(cv2, prop, 1000) < 50
-]
+# Non-platform-specific capture properties (0 <= id < 50)
+_CAP_PROPS = (
+    # Video file position and stream format
+    "CAP_PROP_POS_MSEC",
+    "CAP_PROP_POS_FRAMES",
+    "CAP_PROP_POS_AVI_RATIO",
+    "CAP_PROP_FRAME_WIDTH",
+    "CAP_PROP_FRAME_HEIGHT",
+    "CAP_PROP_FPS",
+    "CAP_PROP_FOURCC",
+    "CAP_PROP_FRAME_COUNT",
+    "CAP_PROP_FORMAT",
+    "CAP_PROP_MODE",
+    "CAP_PROP_CONVERT_RGB",
+    "CAP_PROP_BUFFERSIZE",
+    "CAP_PROP_SAR_NUM",
+    "CAP_PROP_SAR_DEN",
+    "CAP_PROP_BACKEND",
+    "CAP_PROP_CHANNEL",
+    "CAP_PROP_CODEC_PIXEL_FORMAT",
+    "CAP_PROP_BITRATE",
+    "CAP_PROP_ORIENTATION_META",
+    "CAP_PROP_ORIENTATION_AUTO",
+    # Image adjustments
+    "CAP_PROP_BRIGHTNESS",
+    "CAP_PROP_CONTRAST",
+    "CAP_PROP_SATURATION",
+    "CAP_PROP_HUE",
+    "CAP_PROP_GAIN",
+    "CAP_PROP_GAMMA",
+    "CAP_PROP_SHARPNESS",
+    "CAP_PROP_MONOCHROME",
+    "CAP_PROP_BACKLIGHT",
+    # Exposure, white balance, and focus
+    "CAP_PROP_EXPOSURE",
+    "CAP_PROP_AUTO_EXPOSURE",
+    "CAP_PROP_ISO_SPEED",
+    "CAP_PROP_IRIS",
+    "CAP_PROP_AUTO_WB",
+    "CAP_PROP_WB_TEMPERATURE",
+    "CAP_PROP_WHITE_BALANCE_BLUE_U",
+    "CAP_PROP_WHITE_BALANCE_RED_V",
+    "CAP_PROP_FOCUS",
+    "CAP_PROP_AUTOFOCUS",
+    "CAP_PROP_ZOOM",
+    # Camera hardware
+    "CAP_PROP_PAN",
+    "CAP_PROP_TILT",
+    "CAP_PROP_ROLL",
+    "CAP_PROP_TEMPERATURE",
+    "CAP_PROP_TRIGGER",
+    "CAP_PROP_TRIGGER_DELAY",
+    "CAP_PROP_RECTIFICATION",
+    "CAP_PROP_GUID",
+    "CAP_PROP_SETTINGS",
+)
+
+# Property IDs looked up once so attribute access doesn't have to query cv2
+_PROP_IDS = {prop: getattr(cv2, prop) for prop in _CAP_PROPS if hasattr(cv2, prop)}
+
+# Descriptions of the capture properties, where known
+_PROP_DESCRIPTIONS = {
+    "CAP_PROP_POS_MSEC": "Current position of the video file in milliseconds.",
+    "CAP_PROP_POS_FRAMES": "0-based index of the frame to be decoded/captured next.",
+    "CAP_PROP_POS_AVI_RATIO": "Relative position of the video file: 0 - start, 1 - end.",
+    "CAP_PROP_FRAME_WIDTH": "Width of the frames in the video stream.",
+    "CAP_PROP_FRAME_HEIGHT": "Height of the frames in the video stream.",
+    "CAP_PROP_FPS": "Frame rate.",
+    "CAP_PROP_FOURCC": "4-character code of codec.",
+    "CAP_PROP_FRAME_COUNT": "Number of frames in the video file.",
+    "CAP_PROP_FORMAT": "Format of the Mat objects returned by retrieve().",
+    "CAP_PROP_MODE": "Backend-specific value indicating the current capture mode.",
+    "CAP_PROP_BRIGHTNESS": "Brightness of the image (only for cameras).",
+    "CAP_PROP_CONTRAST": "Contrast of the image (only for cameras).",
+    "CAP_PROP_SATURATION": "Saturation of the image (only for cameras).",
+    "CAP_PROP_HUE": "Hue of the image (only for cameras).",
+    "CAP_PROP_GAIN": "Gain of the image (only for cameras).",
+    "CAP_PROP_EXPOSURE": "Exposure (only for cameras).",
+    "CAP_PROP_CONVERT_RGB": "Booleans indicating whether images should be converted to RGB.",
+    "CAP_PROP_RECTIFICATION": "Rectification flag for stereo cameras.",
+    "CAP_PROP_ISO_SPEED": "The ISO speed of the camera.",
+    "CAP_PROP_BUFFERSIZE": "Amount of frames stored in internal buffer memory.",
+}
 
 # Editable camera settings to show
 _GUI_SETTINGS = {
@@ -44,6 +123,12 @@ _GUI_INFO = {
 # Backend for cameras
 _DEFAULT_BACKEND = cv2.CAP_DSHOW  # cv2.CAP_DSHOW or cv2.CAP_MSMF
 
+# Number of recent frame times used to calculate the real FPS
+_FPS_WINDOW = 60
+
+# Give up on a frame after this many consecutive failed grabs (e.g. the camera was unplugged)
+_MAX_GRAB_FAILURES = 100
+
 
 def list_cameras() -> list[int]:
     """
@@ -57,40 +142,36 @@ def list_cameras() -> list[int]:
     """
 
     # Add camera indices until list is exhausted
+    # A single capture is reused since open() releases whichever device was previously opened
     cam_list = []
+    cap = cv2.VideoCapture()
 
     for idx in range(100):
-        cap = cv2.VideoCapture(idx, _DEFAULT_BACKEND)
-        if not cap.read()[0]:
+        if not (cap.open(idx, _DEFAULT_BACKEND) and cap.grab()):
             break
-        else:
-            cam_list.append(idx)
-        cap.release()
+        cam_list.append(idx)
 
-    # This seems to help fix FPS when using backend CAP_DSHOW
-    cv2.destroyAllWindows()
+    cap.release()
 
     return cam_list
 
 
 def get_available_cameras() -> dict:
-    """Get available cameras as a dictionary of {source: name}."""
-    cams = list_cameras()
-    available = {}
-
-    for src in cams:
-        try:
-            with UsbCamera(src=src) as cam:
-                if cam.initialized:
-                    available[src] = str(cam)
-                else:
-                    print(f"USB camera {src} is not available")
-        except CameraError:
-            print("No USB cameras detected")
+    """
+    Get available cameras as a dictionary of {source: name}. list_cameras() has already opened
+    each camera and grabbed a frame, so they aren't opened again here.
+    """
+    available = {src: _camera_name(src) for src in list_cameras()}
+    if not available:
+        print("No USB cameras detected")
 
     return available
 
 
+def _camera_name(src: int) -> str:
+    return f"USB (Port {src})"
+
+
 class UsbCamera:
     """
     A class used to encapsulate a cv2.VideoCapture camera.
@@ -107,29 +188,6 @@ class UsbCamera:
 
     """
 
-    _cap_props = {
-        "CAP_PROP_POS_MSEC": "Current position of the video file in milliseconds.",
-        "CAP_PROP_POS_FRAMES": "0-based index of the frame to be decoded/captured next.",
-        "CAP_PROP_POS_AVI_RATIO": "Relative position of the video file: 0 - start, 1 - end.",
-        "CAP_PROP_FRAME_WIDTH": "Width of the frames in the video stream.",
-        "CAP_PROP_FRAME_HEIGHT": "Height of the frames in the video stream.",
-        "CAP_PROP_FPS": "Frame rate.",
-        "CAP_PROP_FOURCC": "4-character code of codec.",
-        "CAP_PROP_FRAME_COUNT": "Number of frames in the video file.",
-        "CAP_PROP_FORMAT": "Format of the Mat objects returned by retrieve().",
-        "CAP_PROP_MODE": "Backend-specific value indicating the current capture mode.",
-        "CAP_PROP_BRIGHTNESS": "Brightness of the image (only for cameras).",
-        "CAP_PROP_CONTRAST": "Contrast of the image (only for cameras).",
-        "CAP_PROP_SATURATION": "Saturation of the image (only for cameras).",
-        "CAP_PROP_HUE": "Hue of the image (only for cameras).",
-        "CAP_PROP_GAIN": "Gain of the image (only for cameras).",
-        "CAP_PROP_EXPOSURE": "Exposure (only for cameras).",
-        "CAP_PROP_CONVERT_RGB": "Booleans indicating whether images should be converted to RGB.",
-        "CAP_PROP_RECTIFICATION": "Rectification flag for stereo cameras.",
-        "CAP_PROP_ISO_SPEED": "The ISO speed of the camera.",
-        "CAP_PROP_BUFFERSIZE": "Amount of frames stored in internal buffer memory.",
-    }
-
     def __init__(
         self, src: int | str = 0, lock: bool = False, backend: int | None = _DEFAULT_BACKEND
     ) -> None:
@@ -170,12 +228,12 @@ class UsbCamera:
         # Get camera attributes
         for attr in _CAP_PROPS:
             self.camera_attributes[attr] = {}
-            if attr in self._cap_props:
-                self.camera_attributes[attr]["description"] = self._cap_props[attr]
+            if attr in _PROP_DESCRIPTIONS:
+                self.camera_attributes[attr]["description"] = _PROP_DESCRIPTIONS[attr]
 
         # Other attributes which may be accessed later
         self._running = True  # camera is running as soon as you connect to it
-        self._frame_times: collections.deque[float] = collections.deque()
+        self._frame_times: collections.deque[float] = collections.deque(maxlen=_FPS_WINDOW)
         self._incomplete_image_count = 0
 
     def __getattr__(self, attr: str) -> Any:
@@ -183,20 +241,15 @@ class UsbCamera:
         if attr in self.__dict__:
             return self.__dict__[attr]
 
-        elif attr in self.camera_attributes:
-            propId = getattr(cv2, attr, None)
-            if propId is None:
-                raise AttributeError(f"{attr} is not a valid propId")
-            return self.cam.get(propId)
+        elif attr in _PROP_IDS:
+            return self.cam.get(_PROP_IDS[attr])
 
         else:
             raise AttributeError(attr)
 
     def __setattr__(self, attr: str, val: Any) -> None:
-        if attr in self.camera_attributes:
-            propId = getattr(cv2, attr, None)
-            if propId is None:
-                raise AttributeError(f"Unknown propId '{attr}'")
+        if attr in _PROP_IDS:
+            propId = _PROP_IDS[attr]
 
             # In order to change CAP_PROP_EXPOSURE, it has to be set to 0.25
             # first in order to enable manual exposure
@@ -232,7 +285,7 @@ class UsbCamera:
         self.close()
 
     def __str__(self) -> str:
-        return f"USB (Port {self._src})"
+        return _camera_name(self._src)
 
     @property
     def name(self) -> str:
@@ -269,7 +322,7 @@ class UsbCamera:
         # Calculate average FPS of the most recent n frames
         else:
             dt = self._frame_times[-1] - self._frame_times[0]
-            return len(self._frame_times) / max(dt, 1)
+            return (len(self._frame_times) - 1) / dt if dt > 0 else 0.0
 
     @property
     def width(self) -> int:
@@ -304,25 +357,30 @@ class UsbCamera:
         self.stop()
         self.cam.release()
 
-    def get_array(self, complete_frames_only: bool = False) -> np.ndarray:
-        # Grab and retrieve the camera array
-        is_complete, array = self.cam.read()
-
-        # Increment incomplete image count if full image is not retrieved
-        if not is_complete:
+    def get_array(self, complete_frames_only: bool = False) -> np.ndarray | None:
+        # Grab frames until one is complete; grab() doesn't decode, so only the frame that is
+        # actually returned pays for retrieve(). Looping avoids recursing on every dropped frame.
+        failures = 0
+        while True:
+            if self.cam.grab():
+                is_complete, array = self.cam.retrieve()
+                if is_complete:
+                    break
+
+            # Increment incomplete image count if full image is not retrieved
             self._incomplete_image_count += 1
+            failures += 1
 
-        # Ensure complete image is returned if option is chosen
-        if complete_frames_only and not is_complete:
-            return self.get_array(complete_frames_only)
+            # Ensure complete image is returned if option is chosen, but don't spin forever
+            # if the camera was stopped, released or disconnected
+            if not complete_frames_only or failures >= _MAX_GRAB_FAILURES:
+                return None
+            if not self._running or not self.cam.isOpened():
+                return None
 
         # Store frame time for real FPS calculation
         self._frame_times.append(time.time())
 
-        # If more than 3600 frame times stored, pop the latest
-        if len(self._frame_times) > 3600:
-            self._frame_times.popleft()
-
         return array
 
     def disable_auto_exposure(self) -> None:
@@ -34,6 +34,7 @@ class VideoFrameItem(QtWidgets.QGraphicsPixmapItem):
     def __init__(self, parent: QtWidgets.QGraphicsItem | None = None) -> None:
         super().__init__(parent)
         self._colormap: str | None = None
+        self._colortable: list[int] | None = None
 
         # Because this class does not inherit from QObject, it cannot emit signals on its own, so
         # we must use a helper class instance to emit images
@@ -61,12 +62,12 @@ class VideoFrameItem(QtWidgets.QGraphicsPixmapItem):
 
         self._colormap = cmap_name
 
+        # Build the 256-entry colortable once here instead of looking it up for every frame
+        self._colortable = colormap.get_colortable(cmap_name) if cmap_name is not None else None
+
     def get_colortable(self) -> list[int] | None:
         """The colortable to apply to frames before setting them."""
-        if (cmap := self.get_colormap()) is None:
-            return None
-
-        return colormap.get_colortable(cmap)
+        return self._colortable
 
     def set_frame(self, frame: QtMultimedia.QVideoFrame) -> None:
         """Sets the given video frame to be displayed."""
@@ -160,19 +160,28 @@ def list_colormaps() -> list[str]:
     return plt.colormaps()
 
 
+@functools.lru_cache
+def get_rgba_array(cmap_name: str, lut: int = 256, reversed: bool = False) -> np.ndarray:
+    """Returns a read-only (lut, 4) uint8 array of the RGBA colors in the given colormap."""
+    cmap = get_colormap(cmap_name, lut=lut, reversed=reversed)
+    rgba_array = plt.cm.ScalarMappable(cmap=cmap).to_rgba(np.linspace(0, 1, lut), bytes=True)
+    rgba_array.flags.writeable = False
+    return rgba_array
+
+
 @functools.lru_cache
 def get_colors(cmap_name: str, lut: int = 256, reversed: bool = False) -> list[QtGui.QColor]:
     """Returns a list of the colors in the given colormap."""
-    cmap = plt.get_cmap(cmap_name, lut=lut)
-    rgba_array = plt.cm.ScalarMappable(cmap=cmap).to_rgba(np.linspace(0, 1, lut), bytes=True)
-    colors = [QtGui.QColor(*rgb) for rgb in rgba_array]
-    return colors
+    return [QtGui.QColor(*rgba) for rgba in get_rgba_array(cmap_name, lut, reversed).tolist()]
 
 
 @functools.lru_cache
 def get_colortable(cmap_name: str, reversed: bool = False) -> list[int]:
     """Returns a 256-item RGB integer colortable for the given colormap."""
-    return [color.rgb() for color in get_colors(cmap_name, lut=256, reversed=reversed)]
+    # Pack the colors into opaque 0xAARRGGBB values, as QColor.rgb() would
+    rgb = get_rgba_array(cmap_name, lut=256, reversed=reversed)[:, :3].astype(np.uint32)
+    colortable = 0xFF000000 | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    return colortable.tolist()
 
 
 class ColormapImage(QtGui.QImage):
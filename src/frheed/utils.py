@@ -348,8 +348,10 @@ def get_qpen(color: str | tuple | QColor, cosmetic: bool = True) -> QPen:
 
 
 def snip_lists(*lists: NDArray[np.float64]) -> list[NDArray[np.float64]]:
+    """Truncate the sequences to the length of the shortest one."""
+    # Don't slice (which copies lists) sequences that are already the right length
     min_len = min(map(len, lists))
-    return [L[:min_len] for L in lists]
+    return [L if len(L) == min_len else L[:min_len] for L in lists]
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ https://stackoverflow.com/a/33453124/10342097
 """
 
 import logging
+import math
 import os
 import time
 from datetime import datetime
@@ -42,9 +43,16 @@ from frheed.image_processing import (
     extend_image,
     get_valid_colormaps,
     ndarray_to_qpixmap,
+    norm_scratch,
     to_grayscale,
 )
-from frheed.widgets.canvas_widget import CanvasWidget
+from frheed.widgets.canvas_widget import (
+    CanvasWidget,
+    ShapeKind,
+    apply_mask,
+    integral_image,
+    region_mean,
+)
 from frheed.widgets.common_widgets import DoubleSlider, HLine, SliderLabel
 
 MIN_ZOOM = 0.20
@@ -54,7 +62,9 @@ MIN_H = 348
 MAX_W = 2560
 MAX_H = 2560
 DEFAULT_CMAP = "Spectral"
-DEFAULT_INTERPOLATION = cv2.INTER_CUBIC
+DEFAULT_INTERPOLATION = cv2.INTER_LINEAR
+STATUS_INTERVAL = 0.25  # minimum time in seconds between status bar updates
+IDLE_WAIT_MS = 50  # how long the camera thread sleeps between checks while the camera is stopped
 
 
 class VideoWidget(QWidget):
@@ -62,6 +72,7 @@ class VideoWidget(QWidget):
 
     frame_changed = pyqtSignal()
     frame_ready = pyqtSignal(np.ndarray)
+    _frame_received = pyqtSignal()
     _min_w = 480
     _min_h = 348
     _max_w = MAX_W
@@ -78,6 +89,11 @@ class VideoWidget(QWidget):
         # Video writer for saving video
         self._writer: cv2.VideoWriter | None = None
 
+        # Reusable buffer and running statistics for normalizing frames before the colormap is
+        # applied
+        self._norm_scratch: np.ndarray | None = None
+        self._norm_state: dict[str, float] = {}
+
         # Store camera reference and start the camera
         self.set_camera(camera)
 
@@ -182,7 +198,15 @@ class VideoWidget(QWidget):
         self.camera_worker = CameraWorker(self)
         self.camera_thread = QThread()
         self.camera_worker.moveToThread(self.camera_thread)
-        self.camera_worker.frame_ready.connect(self.show_frame)
+
+        # Frames are received in the camera thread and only the most recent one is shown, so
+        # frames arriving faster than they can be displayed are dropped instead of queueing up
+        self._pending_frame: np.ndarray | None = None
+        self._frame_scheduled = False
+        self._frame_received.connect(self._show_pending_frame)
+        self.camera_worker.frame_ready.connect(
+            self._receive_frame, Qt.ConnectionType.DirectConnection
+        )
         self.camera_worker.finished.connect(self.camera_thread.quit)
         self.camera_thread.started.connect(self.camera_worker.start)
         self.camera_thread.start()
@@ -196,7 +220,11 @@ class VideoWidget(QWidget):
         self.analysis_thread.start()
 
         # Connect other signals
-        self.frame_ready.connect(self.analysis_worker.analyze_frame)
+        # Frames are handed to the analysis worker directly from this (the GUI) thread, so that
+        # frames arriving while it is busy replace each other instead of queueing up
+        self.frame_ready.connect(
+            self.analysis_worker.submit_frame, Qt.ConnectionType.DirectConnection
+        )
 
         # Variables to be used in properties
         self._workers = (self.camera_worker, self.analysis_worker)
@@ -252,30 +280,59 @@ class VideoWidget(QWidget):
             self.camera.start(continuous=True)
             self.play_button.setText("Stop Camera")
 
+    def _receive_frame(self, frame: np.ndarray) -> None:
+        """Store a frame from the camera thread and schedule it to be shown if none is pending"""
+        self._pending_frame = frame
+        if not self._frame_scheduled:
+            self._frame_scheduled = True
+            self._frame_received.emit()
+
+    @pyqtSlot()
+    def _show_pending_frame(self) -> None:
+        # Clear the flag first so a frame received while this one is shown schedules another pass
+        self._frame_scheduled = False
+        frame, self._pending_frame = self._pending_frame, None
+        if frame is not None:
+            self.show_frame(frame)
+
     @pyqtSlot(np.ndarray)
     def show_frame(self, frame: np.ndarray) -> None:
         """Show the next camera frame"""
-        # Store raw frame
-        self.raw_frame = frame.copy()
-
-        # Resize to display size and get dimensions
-        frame = self._resize_frame(frame)
+        # Store raw frame; cameras return a new array for every frame, so it doesn't need a copy
+        self.raw_frame = frame
+
+        # While the window is minimized or the widget is hidden, only do the work needed for
+        # analysis and recording
+        displayed = self.isVisible() and not self.window().isMinimized()
+        recording = self._writer is not None
+        if not (displayed or recording or self.analyze_frames):
+            return
 
-        # Convert to grayscale
+        # Convert to grayscale first so only a single channel has to be resized
         frame = to_grayscale(frame)
 
+        # Resize to display size
+        frame = self._resize_frame(frame)
+
         # Emit the frame if analysis is needed
         self.frame_ready.emit(frame) if self.analyze_frames else None
+        if not (displayed or recording):
+            return
 
-        # Apply colormap
-        frame = apply_cmap(frame, self.colormap)
+        # Apply colormap; frames of a stream share normalization statistics
+        self._norm_scratch = norm_scratch(frame, self._norm_scratch)
+        frame = apply_cmap(
+            frame, self.colormap, state=self._norm_state, scratch=self._norm_scratch
+        )
 
-        # Store the processed frame
-        self.frame = frame.copy()
+        # Store the processed frame; apply_cmap always returns a new array so no copy is needed
+        self.frame = frame
 
         # Write to video file if saving; expects frame to be same shape as writer with BGR channels
-        if self._writer is not None:
-            self._writer.write(cv2.cvtColor(self.frame, cv2.COLOR_RGB2BGR))
+        if recording:
+            self._writer.write(self.frame)
+        if not displayed:
+            return
 
         # Create QPixmap from numpy array
         qpix = ndarray_to_qpixmap(frame)
@@ -425,6 +482,9 @@ class VideoWidget(QWidget):
         self._camera = camera
         self._camera.start(continuous=True)
 
+        # Don't scale the new camera's frames by the old camera's brightness
+        self._norm_state.clear()
+
         # Update the zoom slider (if it has been created)
         if not hasattr(self, "slider"):
             return
@@ -831,6 +891,9 @@ class CameraSettingsWidget(QWidget):
             max_val = info.get("max", None)
             value = info.get("value", None)
 
+            # The value last written to the camera, so unchanged values aren't written again
+            self._camera_value = value
+
             # Settings
             self.setMouseTracking(True)
 
@@ -960,12 +1023,18 @@ class CameraSettingsWidget(QWidget):
                 return self.widget.isChecked()
 
         def change_setting(self, value: bool | str | float) -> None:
+            # Skip writing to the camera if the value hasn't changed, for example when a saved
+            # configuration sets a widget to the value it already has
+            value = self.get_value()  # stateChanged emits a bit, not bool
+            if value == self._camera_value:
+                return
+
             # Mark the SettingsWidget as not saved
             self._parent.saved = False
 
-            value = self.get_value()  # stateChanged emits a bit, not bool
             try:
                 setattr(self._parent.camera, self.name, value)
+                self._camera_value = value
 
                 if isinstance(value, (float, int)):
                     message = f"Successfully set {self.name} to {value:,g}"
@@ -1013,6 +1082,9 @@ class CameraStatusBar(QStatusBar):
         self.insertWidget(1, self.incomplete_frames_label, 1)
         self.insertWidget(2, self.error_label, 0)
 
+        # Time of the last label update, so they are refreshed at a readable rate
+        self._last_update = -math.inf
+
         # Display status
 
         # # Remove border on widget
@@ -1043,11 +1115,48 @@ class CameraStatusBar(QStatusBar):
 
     @pyqtSlot()
     def frame_changed(self) -> None:
+        # The labels can't be read at the camera frame rate, so only refresh them periodically
+        now = time.monotonic()
+        if now - self._last_update < STATUS_INTERVAL:
+            return
+        self._last_update = now
+
         self.fps_label.setText(f"{self.fps:.2f} Hz ")
         self.incomplete_frames_label.setText(f"Incomplete images: {self.incomplete_image_count}")
         self.error_label.setText(self.error_status)
 
 
+class SampleSeries:
+    """
+    An append-only series of float samples in a preallocated array that doubles in size when it
+    fills up, instead of a list of Python floats.
+
+    It is written by one thread and read by another, so a sample is always stored before the
+    length is increased, and growing replaces the array rather than resizing it in place; a
+    reader that sliced the old array still holds valid data.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._data = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int | slice) -> float | np.ndarray:
+        """Index or slice the stored samples (as a view, for slices)"""
+        return self._data[: self._size][index]
+
+    def append(self, value: float) -> None:
+        size = self._size
+        if size == len(self._data):
+            data = np.empty(2 * size, dtype=np.float64)
+            data[:size] = self._data
+            self._data = data
+        self._data[size] = value
+        self._size = size + 1
+
+
 class Worker(QObject):
     """
     A base class for worker objects.
@@ -1086,10 +1195,19 @@ class CameraWorker(Worker):
     def start(self) -> None:
         self._running = True
         while self.running():
-            # Emit the next frame
+            # Emit the next frame; getting it blocks until the camera delivers one, but a stopped
+            # camera returns immediately, so sleep instead of spinning until it is restarted
             try:
-                if self.camera().running:
-                    self.frame_ready.emit(self.camera().get_array(complete_frames_only=True))
+                camera = self.camera()
+                frame = None
+                if camera is not None and camera.running:
+                    frame = camera.get_array(complete_frames_only=True)
+
+                # No frame means the camera is stopped or couldn't deliver one, so back off
+                if frame is not None:
+                    self.frame_ready.emit(frame)
+                else:
+                    QThread.msleep(IDLE_WAIT_MS)
 
             # Ignore RuntimeError, for example if the object is deleted
             except RuntimeError:
@@ -1112,10 +1230,22 @@ class AnalysisWorker(Worker):
     """
 
     data_ready = pyqtSignal(dict)
+    _frame_submitted = pyqtSignal()
 
     data = {}
     start_time = None
 
+    def __init__(self, parent: VideoWidget):
+        super().__init__(parent)
+
+        # The most recent frame waiting to be analyzed
+        self._pending_frame: np.ndarray | None = None
+        self._scheduled = False
+        self._frame_submitted.connect(self._analyze_pending_frame)
+
+        # Number of frames analyzed, so readers can tell when there is new data
+        self._frame_count = 0
+
     @property
     def shapes(self) -> list | tuple:
         return getattr(self.canvas(), "shapes", ())
@@ -1124,6 +1254,24 @@ class AnalysisWorker(Worker):
     def raw_frame(self) -> np.ndarray | None:
         return getattr(self.camera(), "raw_frame", None)
 
+    def submit_frame(self, frame: np.ndarray) -> None:
+        """
+        Queue a frame for analysis (from any thread). If the worker is still busy with an earlier
+        frame, only the most recent frame submitted in the meantime will be analyzed.
+        """
+        self._pending_frame = frame
+        if not self._scheduled:
+            self._scheduled = True
+            self._frame_submitted.emit()
+
+    @pyqtSlot()
+    def _analyze_pending_frame(self) -> None:
+        # Clear the flag first so a frame submitted during analysis schedules another pass
+        self._scheduled = False
+        frame, self._pending_frame = self._pending_frame, None
+        if frame is not None:
+            self.analyze_frame(frame)
+
     @pyqtSlot(np.ndarray)
     def analyze_frame(self, frame: np.ndarray) -> None:
         if not self.running():
@@ -1134,25 +1282,34 @@ class AnalysisWorker(Worker):
             self.reset_timer()
         t = time.time() - self.start_time
 
-        # Get pixel intensities under regions of interest
-        for shape in self.shapes:
-            # Get the mask
-            mask = shape.mask
+        # Build the frame's summed-area table once if averaging each rectangle directly would
+        # read more pixels than building the table does; each rectangle is then 4 lookups
+        shapes = list(self.shapes)
+        rectangle_area = sum(
+            shape.width() * shape.height()
+            for shape in shapes
+            if shape.kind_id == ShapeKind.RECTANGLE
+        )
+        integral = integral_image(frame) if rectangle_area > frame.size else None
 
-            # Make sure the mask and frame have the same shape
-            if mask.shape != frame.shape:
+        # Get pixel intensities under regions of interest
+        for shape in shapes:
+            # Extract the data under lines, or only the mean under regions; skip the shape if the
+            # frame and canvas sizes differ
+            if shape.kind == "line":
+                data = apply_mask(frame, shape)
+            else:
+                data = region_mean(frame, shape, integral)
+            if data is None:
                 continue
 
-            # Extract the data based on the mask region
-            data = frame[mask]
-
             # Store the data
             color = shape.color_name
             if color not in self.data:
                 self.data[color] = {
-                    "time": [],
+                    "time": SampleSeries(),
                     "sum": [],
-                    "average": [],
+                    "average": SampleSeries(),
                     "x": [],
                     "y": [],
                     "image": None,
@@ -1181,12 +1338,20 @@ class AnalysisWorker(Worker):
                     self.data[color]["image"] = extend_image(img, ydata)
 
             else:
-                # Make sure sum is non-zero to avoid divide-by-zero
-                mask_sum = mask.sum()
-                if mask_sum != 0:
-                    self.data[color]["average"].append(data.sum() / mask_sum)
+                self.data[color]["average"].append(data)
 
-        self.data_ready.emit(self.data.copy())
+        # Only copy the data for a signal if something is listening for it
+        self._frame_count += 1
+        if self.receivers(self.data_ready) > 0:
+            self.data_ready.emit(self.data.copy())
+
+    def get_snapshot(self) -> tuple[int, dict]:
+        """
+        Get the number of frames analyzed so far and a shallow copy of the data, for polling from
+        another thread. The copy is made in a single call, so the worker can't change the set of
+        colors partway through; the per-color series only ever grow while it is in use.
+        """
+        return self._frame_count, self.data.copy()
 
     @pyqtSlot()
     def start(self) -> None:
@@ -4,51 +4,207 @@ PyQt widgets for drawing shapes.
 
 from __future__ import annotations
 
+import math
+from enum import IntEnum
+
+import cv2
 import numpy as np
-from PyQt6.QtCore import QEvent, QLine, QPoint, QRect, QSize, Qt, pyqtSignal, pyqtSlot
-from PyQt6.QtGui import QColor, QPainter, QPen, QPixmap
+from PyQt6.QtCore import (
+    QEvent,
+    QLine,
+    QPoint,
+    QPointF,
+    QRect,
+    QRectF,
+    QSize,
+    Qt,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot,
+)
+from PyQt6.QtGui import QColor, QCursor, QPainter, QPainterPath, QPaintEvent, QPen
 from PyQt6.QtWidgets import QAction, QActionGroup, QApplication, QLabel, QMenu, QMessageBox, QWidget
 
 from frheed.constants import COLOR_DICT
 from frheed.utils import get_qcolor
 
+_COLOR_VALUES = tuple(COLOR_DICT.values())
+_N_COLORS = len(_COLOR_VALUES)
+
 SHAPE_TYPES = ("rectangle", "ellipse", "line")
-DEFAULT_COLOR = list(COLOR_DICT.values())[0]
+DEFAULT_COLOR = _COLOR_VALUES[0]
 DEFAULT_LINEWIDTH = 1
 FOCUSED_LINEWIDTH = 2
 EDGE_PAD = 8
 MIN_SHAPE_SIZE = 10
+REDRAW_INTERVAL = 16  # ms, about one frame at 60 Hz
+BROAD_PHASE_MIN_SHAPES = 16  # below this, hit-testing every shape is faster
 
 _EDGES = ("left", "right", "bottom", "top")
 _CORNERS = ("top_left", "top_right", "bottom_left", "bottom_right")
 _SHAPE_REGIONS = _EDGES + _CORNERS
+
+# Which coordinates count towards the distance from each shape region (in _SHAPE_REGIONS order);
+# edges only use the distance perpendicular to the edge
+_REGION_X_WEIGHT = np.array([1, 1, 0, 0, 1, 1, 1, 1])
+_REGION_Y_WEIGHT = np.array([0, 0, 1, 1, 1, 1, 1, 1])
+
 _LINE_REGIONS = ("p1", "p2", "middle")
-_CURSORS = {
-    "left": Qt.SizeHorCursor,
-    "right": Qt.SizeHorCursor,
-    "top": Qt.SizeVerCursor,
-    "bottom": Qt.SizeVerCursor,
-    "top_left": Qt.SizeFDiagCursor,
-    "bottom_right": Qt.SizeFDiagCursor,
-    "top_right": Qt.SizeBDiagCursor,
-    "bottom_left": Qt.SizeBDiagCursor,
-    "p1": Qt.OpenHandCursor,
-    "p2": Qt.OpenHandCursor,
-    "middle": Qt.SizeAllCursor,
-}
+
+# Image dtypes that cv2.integral() can sum into 64-bit floats
+_INTEGRAL_DTYPES = tuple(
+    np.dtype(t) for t in (np.uint8, np.uint16, np.int16, np.float32, np.float64)
+)
+
+# Cursors for each region, in the same order as _SHAPE_REGIONS and _LINE_REGIONS
+_SHAPE_CURSORS = (
+    Qt.SizeHorCursor,  # left
+    Qt.SizeHorCursor,  # right
+    Qt.SizeVerCursor,  # bottom
+    Qt.SizeVerCursor,  # top
+    Qt.SizeFDiagCursor,  # top_left
+    Qt.SizeBDiagCursor,  # top_right
+    Qt.SizeBDiagCursor,  # bottom_left
+    Qt.SizeFDiagCursor,  # bottom_right
+)
+_LINE_CURSORS = (
+    Qt.OpenHandCursor,  # p1
+    Qt.OpenHandCursor,  # p2
+    Qt.SizeAllCursor,  # middle
+)
+
+# QCursor objects for each cursor shape, created when first needed (after the QApplication)
+_QCURSORS: dict[Qt.CursorShape, QCursor] = {}
+
+
+class ShapeKind(IntEnum):
+    """Integer shape kinds, in the same order as SHAPE_TYPES"""
+
+    RECTANGLE = 0
+    ELLIPSE = 1
+    LINE = 2
 
 
-# https://stackoverflow.com/a/2233538/10342097
 def line_point_dist(line: QLine, point: QPoint) -> float:
     """Calculate the shortest distance between a QLine and a QPoint"""
+    return segment_point_dist(line.x1(), line.y1(), line.x2(), line.y2(), point.x(), point.y())
+
+
+def apply_mask(image: np.ndarray, shape: CanvasShape | CanvasLine) -> np.ndarray | None:
+    """
+    Get the pixels of an image that fall inside a shape, or None if the image is not the
+    same size as the shape's mask. Rectangles are sliced out as a view without building a mask.
+    """
+    if shape.kind_id == ShapeKind.RECTANGLE:
+        if shape.mask_shape != image.shape:
+            return None
+        return image[shape.mask_slices]
+
+    mask = shape.mask
+    if mask.shape != image.shape:
+        return None
+    return image[mask]
+
+
+def integral_image(image: np.ndarray) -> np.ndarray | None:
+    """
+    Get the (H + 1, W + 1) summed-area table of a single-channel image, or None if OpenCV can't
+    build one for its dtype. uint8 images use 32-bit integers unless the sum of the whole image
+    could overflow them; other dtypes use 64-bit floats.
+    """
+    if image.dtype == np.uint8 and image.size * 255 < 2**31:
+        sdepth = cv2.CV_32S
+    elif image.dtype in _INTEGRAL_DTYPES:
+        sdepth = cv2.CV_64F
+    else:
+        return None
+    return cv2.integral(image, sdepth=sdepth)
+
+
+def region_mean(
+    image: np.ndarray, shape: CanvasShape, integral: np.ndarray | None = None
+) -> float | None:
+    """
+    Get the mean of the pixels of a single-channel image inside a rectangle or ellipse, or None
+    if the image is not the same size as the shape's mask or no pixels fall inside the shape.
+    The mean is taken over the shape's bounding box only, without copying the pixels out. If the
+    image's integral is given, rectangle means are looked up from its corners instead.
+    """
+    if shape.mask_shape != image.shape:
+        return None
+    slices = shape.mask_slices
+    region = image[slices]
+    if region.size == 0:
+        return None
+    if shape.kind_id == ShapeKind.RECTANGLE:
+        if integral is None:
+            return cv2.mean(region)[0]
+
+        # Slicing clipped the bounding box to the image, so take its extent from the region
+        y1, x1 = slices[0].start, slices[1].start
+        y2, x2 = y1 + region.shape[0], x1 + region.shape[1]
+        total = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        return float(total) / region.size
+
+    # OpenCV takes any nonzero uint8 as inside the mask, so the boolean mask can be reinterpreted
+    mask = shape.mask[slices]
+    if not mask.any():
+        return None
+    return cv2.mean(region, mask=mask.view(np.uint8))[0]
+
+
+def bresenham_line(x1: int, y1: int, x2: int, y2: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the (row, column) indices of the pixels on the line from (x1, y1) to (x2, y2).
+
+    This is Bresenham's line algorithm with integer math only. Rather than stepping the
+    decision parameter one pixel at a time, the step where it crosses zero is calculated
+    directly, so all max(|dx|, |dy|) + 1 pixels are found at once.
+    """
+    dx, dy = x2 - x1, y2 - y1
+    sx = 1 if dx >= 0 else -1
+    sy = 1 if dy >= 0 else -1
+
+    # Step one pixel at a time along the major axis
+    steep = abs(dy) > abs(dx)
+    major, minor = (abs(dy), abs(dx)) if steep else (abs(dx), abs(dy))
+    if major == 0:
+        return np.array([y1], dtype=np.int32), np.array([x1], dtype=np.int32)
+    steps = np.arange(major + 1, dtype=np.int32)
+
+    # Number of minor axis steps taken by each pixel (ties stay on the current row/column)
+    offsets = (2 * minor * steps + major - 1) // (2 * major)
+
+    if steep:
+        return y1 + sy * steps, x1 + sx * offsets
+    return y1 + sy * offsets, x1 + sx * steps
+
+
+def rasterize_line(x1: int, y1: int, x2: int, y2: int, out: np.ndarray) -> np.ndarray:
+    """Set the pixels of a line to True in a preallocated 2D mask, skipping any outside it"""
+    height, width = out.shape
+    ys, xs = bresenham_line(x1, y1, x2, y2)
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    out[ys[inside], xs[inside]] = True
+    return out
+
+
+def get_qcursor(shape: Qt.CursorShape) -> QCursor:
+    """Get the shared QCursor for a cursor shape"""
+    cursor = _QCURSORS.get(shape)
+    if cursor is None:
+        cursor = _QCURSORS[shape] = QCursor(shape)
+    return cursor
+
 
-    # Convert coordinates to float
-    x1, x2, y1, y2 = map(float, (line.x1(), line.x2(), line.y1(), line.y2()))
-    px, py = map(float, (point.x(), point.y()))
-    dx, dy = map(float, (line.dx(), line.dy()))  # should these be abs() values?
+# https://stackoverflow.com/a/2233538/10342097
+def segment_point_dist(x1: float, y1: float, x2: float, y2: float, px: float, py: float) -> float:
+    """Calculate the shortest distance from (px, py) to the segment (x1, y1) - (x2, y2)"""
 
     # Calculate norm
-    norm = dx**2 + dy**2
+    dx = x2 - x1
+    dy = y2 - y1
+    norm = dx * dx + dy * dy
 
     # If norm == 0, return 0
     if norm == 0:
@@ -56,24 +212,16 @@ def line_point_dist(line: QLine, point: QPoint) -> float:
 
     # Calculate slope
     u = ((px - x1) * dx + (py - y1) * dy) / norm
-    u = 1 if u > 1 else 0 if u < 0 else u
-
-    # Calculate relative coordinates
-    rel_x = x1 + u * dx
-    rel_y = y1 + u * dy
-
-    # Calculate X and Y separation
-    sep_x = rel_x - px
-    sep_y = rel_y - py
+    u = 1.0 if u > 1 else 0.0 if u < 0 else u
 
-    # Calculate distance
-    dist = np.sqrt(sep_x**2 + sep_y**2)
-    return dist
+    # Calculate distance to the nearest point on the segment
+    return math.hypot(x1 + u * dx - px, y1 + u * dy - py)
 
 
 class CanvasWidget(QLabel):
     """A widget for drawing shapes"""
 
+    shape_added = pyqtSignal(object)
     shape_deleted = pyqtSignal(object)
 
     def __init__(self, parent: QWidget = None, shape_limit: int = 10):
@@ -105,11 +253,6 @@ class CanvasWidget(QLabel):
         # Set minimum size
         self.setMinimumSize(QSize(3, 3))
 
-        # Create transparent pixmap
-        pixmap = QPixmap(self.size())
-        pixmap.fill(QColor("transparent"))
-        self.setPixmap(pixmap)
-
         # Attributes to be assigned later
         self._drawing: bool = False
         self._draw_start_pos: QPoint | None = None
@@ -124,6 +267,22 @@ class CanvasWidget(QLabel):
         self._active_shape: CanvasShape | None = None
 
         self._pressed_buttons: list[int] = []
+        self._cursor_shape: Qt.CursorShape | None = None
+        self._last_pos = QPoint(-1, -1)
+
+        # Coords and kinds of all shapes as arrays, recreated after any change
+        self._shape_coords: np.ndarray | None = None
+        self._shape_kinds: np.ndarray | None = None
+
+        # Open pixel coordinate grids, recreated when the canvas is resized
+        self._pixel_grid: tuple[np.ndarray, np.ndarray] | None = None
+
+        # Coalesce repaint requests so the canvas repaints at most once per display frame
+        self._dirty_rect: QRect | None = None
+        self._redraw_timer = QTimer(self)
+        self._redraw_timer.setSingleShot(True)
+        self._redraw_timer.setInterval(REDRAW_INTERVAL)
+        self._redraw_timer.timeout.connect(self._do_draw)
 
         # Connect signals
         self.customContextMenuRequested.connect(self.menu_requested)
@@ -131,10 +290,41 @@ class CanvasWidget(QLabel):
 
     def resizeEvent(self, event: QEvent) -> None:
         super().resizeEvent(event)
+        self._pixel_grid = None
 
         # Resize the shapes
+        if not self.shapes:
+            return
         old, new = event.oldSize(), self.size()
-        [shape.rescale(old, new) for shape in self.shapes]
+        w_scale = new.width() / max(old.width(), 1)
+        h_scale = new.height() / max(old.height(), 1)
+
+        # Scale all of the floating point coords at once and repaint the canvas a single time
+        float_coords = np.array([shape.float_coords for shape in self.shapes], dtype=float)
+        float_coords *= (w_scale, h_scale, w_scale, h_scale)
+        for shape, coords in zip(self.shapes, float_coords):
+            shape.float_coords = coords
+            shape.setCoords(*coords.astype(int).tolist())
+        self.draw()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        """Paint the shapes that overlap the region being repainted"""
+        super().paintEvent(event)
+        dirty = event.rect()
+
+        # Get a fresh painter
+        painter = QPainter(self)
+        # painter.setRenderHint(QPainter.Antialiasing)
+
+        # Draw each of the shapes with its cached pen and path
+        for shape in self.shapes:
+            if not dirty.intersects(shape.bounding_rect()):
+                continue
+            painter.setPen(shape.pen())
+            painter.drawPath(shape.path())
+
+        # !!!IMPORTANT!!! End the painter otherwise the GUI will crash
+        painter.end()
 
     def keyPressEvent(self, event: QEvent) -> None:
         super().keyPressEvent(event)
@@ -145,7 +335,7 @@ class CanvasWidget(QLabel):
                 self.active_shape.delete()
 
                 # Restore the mouse cursor
-                self.app.restoreOverrideCursor()
+                self.set_cursor(None)
 
     def mousePressEvent(self, event: QEvent) -> None:
         super().mousePressEvent(event)
@@ -167,18 +357,17 @@ class CanvasWidget(QLabel):
 
         # Right button events
         elif event.button() == Qt.RightButton:
-            # self.app.setOverrideCursor(Qt.ArrowCursor)
-            self.app.restoreOverrideCursor()
+            self.set_cursor(None)
 
         # Middle button events
         elif event.button() == Qt.MiddleButton:
             # Indicate that shape movement can start
             if self.active_shape is not None:
                 self.moving = True
-                if isinstance(self.active_shape, CanvasShape):
-                    self._move_start_pos = self.active_shape.topLeft() - event.pos()
-                elif isinstance(self.active_shape, CanvasLine):
+                if self.active_shape.kind_id == ShapeKind.LINE:
                     self._move_start_pos = self.active_shape.p1() - event.pos()
+                else:
+                    self._move_start_pos = self.active_shape.topLeft() - event.pos()
 
     def mouseReleaseEvent(self, event: QEvent) -> None:
         # Left button events
@@ -196,8 +385,7 @@ class CanvasWidget(QLabel):
         elif event.button() == Qt.RightButton:
             # Restore cursor if not drawing, moving, or resizing
             if not (self.drawing or self.moving or self.resizing):
-                self.app.setOverrideCursor(Qt.ArrowCursor)
-                # self.app.restoreOverrideCursor()
+                self.set_cursor(Qt.ArrowCursor)
                 return
 
         # Middle button events
@@ -211,11 +399,11 @@ class CanvasWidget(QLabel):
 
         # Re-check the override cursor if released mouse is not right mouse
         if self.active_shape is not None and event.button() != Qt.RightButton:
-            region = self.active_shape.nearest_region(event.pos())
-            if region in _CURSORS:
-                self.app.setOverrideCursor(_CURSORS[region])
+            region_id = self.active_shape.nearest_region_id(event.pos())
+            if region_id >= 0:
+                self.set_cursor(self.active_shape.region_cursors[region_id])
         else:
-            self.app.restoreOverrideCursor()
+            self.set_cursor(None)
 
     def mouseMoveEvent(self, event: QEvent) -> None:
         super().mouseMoveEvent(event)
@@ -223,21 +411,28 @@ class CanvasWidget(QLabel):
         # Get the event position
         pos = event.pos()
 
+        # Nothing can change if the mouse is idle and hasn't actually moved
+        if pos == self._last_pos and event.buttons() == Qt.NoButton and self.active_shape is None:
+            return
+        self._last_pos = pos
+
+        # Cursor to show once the event has been handled; unchanged unless hovering over a shape
+        cursor = self._cursor_shape
+
         # Start drawing if mouse has moved > 10 pixels while LMB pressed
         if self.can_draw:
-            x1, y1 = self._draw_start_pos.x(), self._draw_start_pos.y()
-            x2, y2 = pos.x(), pos.y()
-            sep = np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-            if sep > MIN_SHAPE_SIZE:
+            dx = pos.x() - self._draw_start_pos.x()
+            dy = pos.y() - self._draw_start_pos.y()
+            if dx * dx + dy * dy > MIN_SHAPE_SIZE * MIN_SHAPE_SIZE:
                 self.drawing = True
                 self.add_shape(self._draw_start_pos)
 
         # Expand the active shape if one is being drawn
         if self.active_shape is not None and self.drawing:
-            if self.active_shape.kind in ["rectangle", "ellipse"]:
-                self.active_shape.resize("bottom_right", pos)
-            elif self.active_shape.kind == "line":
+            if self.active_shape.kind_id == ShapeKind.LINE:
                 self.active_shape.resize("p2", pos)
+            else:
+                self.active_shape.resize("bottom_right", pos)
 
         # Resize shape
         elif self.active_shape is not None and self.resizing:
@@ -253,15 +448,16 @@ class CanvasWidget(QLabel):
         # If no shape is active and not drawing, moving, or resizing
         else:
             # Detect which shape (if any) is near the cursor
+            near_ids = {id(shape) for shape in self.shapes_near(pos)}
             for shape in self.shapes:
                 # Activate the shape (increase border width)
-                if shape.point_nearby(pos):
+                if id(shape) in near_ids and shape.point_nearby(pos):
                     shape.activate()
 
-                    # Set cursor style
-                    region = shape.nearest_region(pos)
-                    if region in _CURSORS:
-                        self.app.setOverrideCursor(_CURSORS[region])
+                    # Get cursor style
+                    region_id = shape.nearest_region_id(pos)
+                    if region_id >= 0:
+                        cursor = shape.region_cursors[region_id]
 
                 # Deactivate shapes not near the cursor
                 else:
@@ -269,12 +465,14 @@ class CanvasWidget(QLabel):
 
         # If the LMB is pressed and the cursor is an open hand,
         # make the cursor a closed hand
-        if self.app.overrideCursor() is not None and self.button_pressed(Qt.LeftButton):
-            if self.app.overrideCursor().shape() == Qt.OpenHandCursor:
-                self.app.setOverrideCursor(Qt.ClosedHandCursor)
+        if cursor == Qt.OpenHandCursor and self.button_pressed(Qt.LeftButton):
+            cursor = Qt.ClosedHandCursor
 
         # Restore the mouse cursor if no shapes active
-        self.app.restoreOverrideCursor() if self.active_shape is None else None
+        if self.active_shape is None:
+            cursor = None
+
+        self.set_cursor(cursor)
 
     @property
     def app(self) -> QApplication:
@@ -335,10 +533,7 @@ class CanvasWidget(QLabel):
         self._moving = moving
 
         # Update the mouse cursor
-        if moving:
-            self.app.setOverrideCursor(Qt.SizeAllCursor)
-        else:
-            self.app.restoreOverrideCursor()
+        self.set_cursor(Qt.SizeAllCursor if moving else None)
 
     @property
     def shapes(self) -> list[CanvasShape]:
@@ -366,7 +561,7 @@ class CanvasWidget(QLabel):
 
         # Restore mouse cursor if no active shapes
         if self._active_shape is None:
-            self.app.restoreOverrideCursor()
+            self.set_cursor(None)
 
     @pyqtSlot(QPoint)
     def menu_requested(self, p: QPoint) -> None:
@@ -378,6 +573,76 @@ class CanvasWidget(QLabel):
         # Show the menu
         self.menu.popup(self.mapToGlobal(p))
 
+    def shapes_near(self, p: QPoint) -> list[CanvasShape | CanvasLine]:
+        """
+        Get the shapes that may be near a point: those whose bounding boxes, padded by EDGE_PAD,
+        contain it, except for lines, which must be within EDGE_PAD of the point.
+        """
+        shapes = self.shapes
+        if len(shapes) < BROAD_PHASE_MIN_SHAPES:
+            return shapes
+
+        # Test the point against every bounding box at once
+        coords, kinds = self.shape_geometry()
+        px, py = p.x(), p.y()
+        x1, y1, x2, y2 = coords.T.astype(float)
+        hits = (
+            (np.minimum(x1, x2) - EDGE_PAD <= px)
+            & (px <= np.maximum(x1, x2) + EDGE_PAD)
+            & (np.minimum(y1, y2) - EDGE_PAD <= py)
+            & (py <= np.maximum(y1, y2) + EDGE_PAD)
+        )
+
+        # Distance from the point to every line segment at once, as in segment_point_dist()
+        is_line = kinds == ShapeKind.LINE
+        if is_line.any():
+            dx, dy = x2 - x1, y2 - y1
+            norm = dx * dx + dy * dy
+            dot = (px - x1) * dx + (py - y1) * dy
+            u = np.divide(dot, norm, out=np.zeros_like(norm), where=norm != 0)
+            np.clip(u, 0.0, 1.0, out=u)
+
+            # Only the comparison matters, so skip the sqrt and compare squared distances.
+            # segment_point_dist() treats zero-length lines as always near, so keep those too.
+            ex, ey = x1 + u * dx - px, y1 + u * dy - py
+            near = (ex * ex + ey * ey < EDGE_PAD * EDGE_PAD) | (norm == 0)
+            hits &= ~is_line | near
+
+        return [shapes[i] for i in np.flatnonzero(hits)]
+
+    def shape_geometry(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the coords (x1, y1, x2, y2) and kind IDs of all shapes as (N, 4) and (N,) arrays,
+        in the same order as the shapes. The arrays are reused until the shapes change.
+        """
+        if self._shape_coords is None or self._shape_kinds is None:
+            shapes = self.shapes
+            coords = np.array([shape.getCoords() for shape in shapes], dtype=np.int32)
+            self._shape_coords = coords.reshape(len(shapes), 4)
+            self._shape_kinds = np.array([shape.kind_id for shape in shapes], dtype=np.int8)
+        return self._shape_coords, self._shape_kinds
+
+    def pixel_grid(self) -> tuple[np.ndarray, np.ndarray]:
+        """Get the open (Y, X) pixel coordinate grids of the canvas, as from np.ogrid"""
+        if self._pixel_grid is None:
+            self._pixel_grid = tuple(np.ogrid[: self.height(), : self.width()])
+        return self._pixel_grid
+
+    def set_cursor(self, cursor: Qt.CursorShape | None) -> None:
+        """Set the override cursor, or remove it if None, only when it changes"""
+        if cursor == self._cursor_shape:
+            return
+        self._cursor_shape = cursor
+
+        # Keep at most one override cursor on the application's stack
+        if cursor is None:
+            while self.app.overrideCursor() is not None:
+                self.app.restoreOverrideCursor()
+        elif self.app.overrideCursor() is None:
+            self.app.setOverrideCursor(get_qcursor(cursor))
+        else:
+            self.app.changeOverrideCursor(get_qcursor(cursor))
+
     def button_pressed(self, button: int) -> bool:
         return bool(button & int(QApplication.mouseButtons()))
 
@@ -394,81 +659,77 @@ class CanvasWidget(QLabel):
         x, y, w, h = pos.x(), pos.y(), 0, 0
 
         # Create the shape or line
-        if self.shape_type.lower() in ["rectangle", "ellipse"]:
-            shape = CanvasShape(x, y, w, h)
-            shape.kind = self.shape_type.lower()
-
-        elif self.shape_type.lower() == "line":
+        kind = ShapeKind(SHAPE_TYPES.index(self.shape_type.lower()))
+        if kind == ShapeKind.LINE:
             shape = CanvasLine(x, y, x, y)
+        else:
+            shape = CanvasShape(x, y, w, h)
+            shape.kind_id = kind
 
         # Get the next color
-        color_idx = len(self.shapes) % (len(COLOR_DICT) + 1)
-        shape.color = list(COLOR_DICT.values())[color_idx]
+        shape.color = _COLOR_VALUES[len(self.shapes) % _N_COLORS]
 
         # Assign the canvas to the shape
         shape.canvas = self
 
         # Activate the shape, which will also draw it
         shape.activate()
+        self.shape_added.emit(shape)
 
-    def draw(self) -> None:
-        """Redraw all the shapes"""
+    def draw(self, rect: QRect | None = None) -> None:
+        """Schedule a repaint of the whole canvas, or only of 'rect' if given"""
+        # Any change to the shapes comes through here, so the shape arrays may be stale
+        self._shape_coords = None
+        self._shape_kinds = None
 
-        # Get a fresh pixmap
-        pixmap = QPixmap(self.size())
-        pixmap.fill(QColor("transparent"))
+        if rect is None:
+            rect = self.rect()
+        self._dirty_rect = rect if self._dirty_rect is None else self._dirty_rect.united(rect)
+        if not self._redraw_timer.isActive():
+            self._redraw_timer.start()
 
-        # Get a fresh painter
-        painter = QPainter(pixmap)
-        # painter.setRenderHint(QPainter.Antialiasing)
-
-        # Set the pen
-        pen = QPen()
-        pen.setCosmetic(True)
-        painter.setPen(pen)
-
-        # Draw each of the shapes
-        for shape in self.shapes:
-            # Set pen properties
-            pen.setColor(shape.color)
-            pen.setWidth(shape.linewidth)
-            painter.setPen(pen)
-
-            # Draw the shape
-            if shape.kind == "rectangle":
-                painter.drawRect(shape)
-            elif shape.kind == "ellipse":
-                painter.drawEllipse(shape)
-            elif shape.kind == "line":
-                painter.drawLine(shape)
-
-        # !!!IMPORTANT!!! End the painter otherwise the GUI will crash
-        painter.end()
-
-        # Update the pixmap
-        self.setPixmap(pixmap)
+    @pyqtSlot()
+    def _do_draw(self) -> None:
+        """Repaint everything requested since the last repaint (done in paintEvent)"""
+        if self._dirty_rect is not None:
+            self.update(self._dirty_rect)
+            self._dirty_rect = None
 
     @pyqtSlot()
     def clear_canvas(self) -> None:
         """Clear all shapes and reset the canvas"""
-        # Use the delete function so signals are properly emitted
-        # Can't use list comprehension because size of list will change during iteration
-        while self.shapes:
-            self.shapes[0].delete()
+        # Emit the same signal as CanvasShape.delete for each shape, but repaint only once
+        shapes, self._shapes = self._shapes, []
+        for shape in shapes:
+            self.shape_deleted.emit(shape)
+        self.active_shape = None
+        self.draw()
 
 
 class CanvasShape(QRect):
     """A custom QRect that can be assigned to a CanvasWidget."""
 
+    # Cursor to show over each region, indexed by region ID
+    region_cursors = _SHAPE_CURSORS
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         # Attributes to be assigned later
-        self._kind = SHAPE_TYPES[0]
+        self._kind = ShapeKind.RECTANGLE
         self._linewidth: int = DEFAULT_LINEWIDTH
         self._color: str = DEFAULT_COLOR
         self._color_name: str | None = None
         self._canvas: CanvasWidget | None = None
+        self._painted_rect: QRect | None = None
+        self._path = QPainterPath()
+        self._path_key: tuple | None = None
+        self._pen: QPen | None = None
+
+        # Region bounding boxes and reference points, recalculated when the coords change
+        self._region_coords: tuple[int, int, int, int] | None = None
+        self._region_bboxes = np.empty((len(_SHAPE_REGIONS), 4), dtype=np.int32)
+        self._region_points = np.empty((len(_SHAPE_REGIONS), 2), dtype=np.int32)
 
         # Store floating point coords for resizing precision
         self.float_coords = super().getCoords()
@@ -478,8 +739,8 @@ class CanvasShape(QRect):
 
         # Make sure the resulting position is valid
         if self.canvas is not None:
-            new_shape = QRect(p.x(), p.y(), self.width(), self.height())
-            x1, y1, x2, y2 = new_shape.getCoords()
+            x1, y1 = p.x(), p.y()
+            x2, y2 = x1 + self.width() - 1, y1 + self.height() - 1
             width, height = self.canvas.width(), self.canvas.height()
             lw = self.linewidth
             if x1 < 0 or y1 < 0 or x2 > (width - lw) or y2 > (height - lw):
@@ -495,34 +756,32 @@ class CanvasShape(QRect):
     def normalize(self) -> None:
         """Normalize the shape so it has non-negative width/height"""
 
-        top_left, bottom_left = self.topLeft(), self.bottomLeft()
-        top_right, bottom_right = self.topRight(), self.bottomRight()
-
+        # Swap the edges of any negative dimension
+        x1, y1, x2, y2 = self.getCoords()
         if self.width() < 0:
-            self.setTopRight(top_left)
-            self.setTopLeft(top_right)
-            self.setBottomRight(bottom_left)
-            self.setBottomLeft(bottom_right)
-
-        top_left, bottom_left = self.topLeft(), self.bottomLeft()
-        top_right, bottom_right = self.topRight(), self.bottomRight()
-
+            x1, x2 = x2, x1
         if self.height() < 0:
-            self.setTopRight(bottom_right)
-            self.setTopLeft(bottom_left)
-            self.setBottomRight(top_right)
-            self.setBottomLeft(top_left)
+            y1, y2 = y2, y1
+        self.setCoords(x1, y1, x2, y2)
 
         # Update float coords
-        self.float_coords = self.getCoords()
+        self.float_coords = (x1, y1, x2, y2)
 
     @property
     def kind(self) -> str:
-        return self._kind
+        return SHAPE_TYPES[self._kind]
 
     @kind.setter
     def kind(self, kind: str) -> None:
-        self._kind = kind
+        self.kind_id = ShapeKind(SHAPE_TYPES.index(kind))
+
+    @property
+    def kind_id(self) -> ShapeKind:
+        return self._kind
+
+    @kind_id.setter
+    def kind_id(self, kind_id: ShapeKind) -> None:
+        self._kind = kind_id
         self.update()
 
     @property
@@ -532,6 +791,7 @@ class CanvasShape(QRect):
     @color.setter
     def color(self, color: str | tuple | QColor) -> None:
         self._color = get_qcolor(color)
+        self._pen = None
 
     @property
     def color_name(self) -> str:
@@ -558,8 +818,10 @@ class CanvasShape(QRect):
 
     @linewidth.setter
     def linewidth(self, linewidth: int) -> None:
-        self._linewidth = linewidth
-        self.update()
+        if linewidth != self._linewidth:
+            self._linewidth = linewidth
+            self._pen = None
+            self.update()
 
     @property
     def active(self) -> bool:
@@ -577,7 +839,7 @@ class CanvasShape(QRect):
 
     def dist_from_top_left(self, p: QPoint) -> float:
         """Get the distance from a point to the top left corner"""
-        return np.sqrt((self.top() - p.y()) ** 2 + (self.left() - p.x()) ** 2)
+        return math.hypot(self.top() - p.y(), self.left() - p.x())
 
     @property
     def top_right_region(self) -> tuple:
@@ -591,7 +853,7 @@ class CanvasShape(QRect):
 
     def dist_from_top_right(self, p: QPoint) -> float:
         """Get the distance from a point to the top right corner"""
-        return np.sqrt((self.top() - p.y()) ** 2 + (self.right() - p.x()) ** 2)
+        return math.hypot(self.top() - p.y(), self.right() - p.x())
 
     @property
     def bottom_left_region(self) -> tuple:
@@ -605,7 +867,7 @@ class CanvasShape(QRect):
 
     def dist_from_bottom_left(self, p: QPoint) -> float:
         """Get the distance from a point to the bottom left corner"""
-        return np.sqrt((self.bottom() - p.y()) ** 2 + (self.left() - p.x()) ** 2)
+        return math.hypot(self.bottom() - p.y(), self.left() - p.x())
 
     @property
     def bottom_right_region(self) -> tuple:
@@ -619,7 +881,7 @@ class CanvasShape(QRect):
 
     def dist_from_bottom_right(self, p: QPoint) -> float:
         """Get the distance from a point to the bottom left corner"""
-        return np.sqrt((self.bottom() - p.y()) ** 2 + (self.right() - p.x()) ** 2)
+        return math.hypot(self.bottom() - p.y(), self.right() - p.x())
 
     @property
     def left_region(self) -> tuple:
@@ -683,33 +945,88 @@ class CanvasShape(QRect):
         """Get the distance from a point to the top edge"""
         return abs(p.y() - self.top())
 
+    def region_geometry(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the bounding boxes (xmin, ymin, xmax, ymax) and reference points (x, y)
+        of all regions, in the same order as _SHAPE_REGIONS.
+        """
+        coords = self.getCoords()
+        if coords != self._region_coords:
+            x1, y1, x2, y2 = coords
+            pad = EDGE_PAD
+            self._region_bboxes[:] = (
+                (x1 - pad, y1 + pad, x1 + pad, y2 - pad),  # left
+                (x2 - pad, y1 + pad, x2 + pad, y2 - pad),  # right
+                (x1 + pad, y2 - pad, x2 - pad, y2 + pad),  # bottom
+                (x1 + pad, y1 - pad, x2 - pad, y1 + pad),  # top
+                (x1 - pad, y1 - pad, x1 + pad, y1 + pad),  # top_left
+                (x2 - pad, y1 - pad, x2 + pad, y1 + pad),  # top_right
+                (x1 - pad, y2 - pad, x1 + pad, y2 + pad),  # bottom_left
+                (x2 - pad, y2 - pad, x2 + pad, y2 + pad),  # bottom_right
+            )
+            self._region_points[:] = (
+                (x1, 0),
+                (x2, 0),
+                (0, y2),
+                (0, y1),
+                (x1, y1),
+                (x2, y1),
+                (x1, y2),
+                (x2, y2),
+            )
+            self._region_coords = coords
+        return self._region_bboxes, self._region_points
+
+    def near_regions_mask(self, p: QPoint) -> np.ndarray:
+        """Get a boolean array of which regions (in _SHAPE_REGIONS order) are near a point"""
+        bboxes, _ = self.region_geometry()
+        px, py = p.x(), p.y()
+        return (bboxes[:, 0] < px) & (px < bboxes[:, 2]) & (bboxes[:, 1] < py) & (py < bboxes[:, 3])
+
     def point_nearby(self, p: QPoint) -> bool:
         """Check if a QPoint is near any border of the shape"""
-        return any(getattr(self, f"near_{reg}")(p) for reg in _SHAPE_REGIONS)
+        return bool(self.near_regions_mask(p).any())
 
     def nearby_regions(self, p: QPoint) -> list[str]:
         """Get list of regions that are near a point"""
-        return [r for r in _SHAPE_REGIONS if getattr(self, f"near_{r}")(p)]
+        return [_SHAPE_REGIONS[i] for i in np.flatnonzero(self.near_regions_mask(p))]
 
-    def nearest_region(self, p: QPoint) -> str | None:
-        """Determine which region of the shape is closest to the point"""
+    def nearest_region_id(self, p: QPoint) -> int:
+        """Get the index in _SHAPE_REGIONS of the region closest to the point, or -1 if none"""
 
-        # Get list of nearby regions
-        regions = self.nearby_regions(p)
-        if not regions:
-            return None
+        # Get indices of nearby regions
+        idx = np.flatnonzero(self.near_regions_mask(p))
+        if idx.size == 0:
+            return -1
 
         # Return region if only one is nearby
-        elif len(regions) == 1:
-            return regions[0]
+        elif idx.size == 1:
+            return int(idx[0])
 
         # Need to determine which region is closest if there are multiple
-        else:
-            # Get distances from the point to each region
-            seps = [(r, getattr(self, f"dist_from_{r}")(p)) for r in regions]
+        _, points = self.region_geometry()
+        dx = (p.x() - points[idx, 0]) * _REGION_X_WEIGHT[idx]
+        dy = (p.y() - points[idx, 1]) * _REGION_Y_WEIGHT[idx]
+        return int(idx[np.argmin(np.hypot(dx, dy))])
 
-            # Get the name of the nearest region
-            return sorted(seps, key=lambda i: i[1])[0][0]
+    def nearest_region(self, p: QPoint) -> str | None:
+        """Determine which region of the shape is closest to the point"""
+        region_id = self.nearest_region_id(p)
+        return _SHAPE_REGIONS[region_id] if region_id >= 0 else None
+
+    @property
+    def mask_shape(self) -> tuple[int, int]:
+        """Get the (height, width) of the mask: the canvas size, otherwise the shape size"""
+        if self.canvas is None:
+            return self.height(), self.width()
+        size = self.canvas.size()
+        return size.height(), size.width()
+
+    @property
+    def mask_slices(self) -> tuple[slice, slice]:
+        """Get the (row, column) slices of the shape's bounding box, for indexing without a mask"""
+        x1, y1, x2, y2 = self.getCoords()
+        return slice(max(0, y1), y2 + 1), slice(max(0, x1), x2 + 1)
 
     @property
     def mask(self) -> np.ndarray:
@@ -718,12 +1035,7 @@ class CanvasShape(QRect):
         https://stackoverflow.com/a/44874588/10342097
         """
 
-        # Get dimensions of canvas if it exists, otherwise the shape dimensions
-        if self.canvas is None:
-            width, height = self.width(), self.height()
-        else:
-            size = self.canvas.size()
-            width, height = size.width(), size.height()
+        height, width = self.mask_shape
 
         # Get the center of the shape
         center: QPoint = self.center()
@@ -736,15 +1048,23 @@ class CanvasShape(QRect):
 
         # Create the mask by calculating which pixels fall inside the shape
         # For a rectangle, this is simple
-        if self.kind == "rectangle":
-            mask = np.full((height, width), False, dtype=bool)
-            mask[y1 : y2 + 1, x1 : x2 + 1] = True
+        if self._kind == ShapeKind.RECTANGLE:
+            mask = np.zeros((height, width), dtype=bool)
+            mask[self.mask_slices] = True
 
         # Equation for ellipse: ((x - h)^2 / a^2) + ((y - k)^2 / b^2) = 1
         # with center (h, k) and horizontal/vertical radii (a, b)
         else:
-            Y, X = np.ogrid[:height, :width]
-            mask = (((X - h) ** 2 / (a**2)) + ((Y - k) ** 2 / (b**2))) <= 1
+            if self.canvas is None:
+                Y, X = np.ogrid[:height, :width]
+            else:
+                Y, X = self.canvas.pixel_grid()
+
+            # Only the (1, W) and (H, 1) terms are computed; the comparison then broadcasts
+            # straight into the (H, W) mask without any full-size floating point temporaries
+            x_term = np.square(X - h) * (1.0 / (a * a))
+            y_term = np.square(Y - k) * (1.0 / (b * b))
+            mask = y_term <= (1.0 - x_term)
 
         return mask
 
@@ -752,18 +1072,15 @@ class CanvasShape(QRect):
         """Scale the shape when the canvas changes"""
 
         # Get the scale factors
-        w0, h0 = old.width(), old.height()
-        w1, h1 = new.width(), new.height()
-        w_scale, h_scale = (w1 / max(w0, 1)), (h1 / max(h0, 1))
+        w_scale = new.width() / max(old.width(), 1)
+        h_scale = new.height() / max(old.height(), 1)
 
         # Work in floating point to avoid rounding problems
-        x1, y1, x2, y2 = self.float_coords
-        x1_new, x2_new = (x1 * w_scale), (x2 * w_scale)
-        y1_new, y2_new = (y1 * h_scale), (y2 * h_scale)
-        self.float_coords = x1_new, y1_new, x2_new, y2_new
+        scale = np.array([w_scale, h_scale, w_scale, h_scale])
+        self.float_coords = np.multiply(self.float_coords, scale)
 
         # Rescale the shape
-        self.setCoords(int(x1_new), int(y1_new), int(x2_new), int(y2_new))
+        self.setCoords(*self.float_coords.astype(int).tolist())
         self.update()
 
     def resize(self, region: str, p: QPoint) -> None:
@@ -810,10 +1127,38 @@ class CanvasShape(QRect):
         y = max(0, min(self.canvas.height() - self.linewidth, p.y()))
         return QPoint(x, y)
 
+    def path(self) -> QPainterPath:
+        """Get the outline of the shape, rebuilt only when its geometry or kind changes"""
+        key = (self.getCoords(), self._kind)
+        if key != self._path_key:
+            self._path = QPainterPath()
+            if self._kind == ShapeKind.ELLIPSE:
+                self._path.addEllipse(QRectF(self))
+            else:
+                self._path.addRect(QRectF(self))
+            self._path_key = key
+        return self._path
+
+    def pen(self) -> QPen:
+        """Get the pen to draw the shape with, rebuilt only when its color or width changes"""
+        if self._pen is None:
+            self._pen = QPen(self.color)
+            self._pen.setWidth(self.linewidth)
+            self._pen.setCosmetic(True)
+        return self._pen
+
+    def bounding_rect(self, pad: int | None = None) -> QRect:
+        """Get the area of the canvas covered by the shape, including its border"""
+        if pad is None:
+            pad = self.linewidth + 1
+        return self.normalized().adjusted(-pad, -pad, pad, pad)
+
     def update(self) -> None:
-        """Redraw this shape (and all others) on the parent canvas"""
+        """Repaint the area of the parent canvas covered by this shape, before and after"""
         if self.canvas is not None:
-            self.canvas.draw()
+            rect = self.bounding_rect()
+            painted_rect, self._painted_rect = self._painted_rect, rect
+            self.canvas.draw(rect if painted_rect is None else rect.united(painted_rect))
 
     def delete(self) -> None:
         """Remove the shape from the associated canvas"""
@@ -821,6 +1166,7 @@ class CanvasShape(QRect):
             self.canvas.shape_deleted.emit(self)
             self.canvas.shapes.remove(self)
             self.deactivate()
+            self.update()
 
     @pyqtSlot()
     def activate(self) -> None:
@@ -834,14 +1180,17 @@ class CanvasShape(QRect):
         if self.active and self.canvas is not None:
             self.canvas.active_shape = None
         self.linewidth = DEFAULT_LINEWIDTH
-        self.update()
 
 
 class CanvasLine(QLine):
     """A custom QLine that can be assigned to a CanvasWidget."""
 
+    # Cursor to show over each region, indexed by region ID
+    region_cursors = _LINE_CURSORS
+
     # Inherit methods from CanvasShape
     validate_position = CanvasShape.validate_position
+    rescale = CanvasShape.rescale
     update = CanvasShape.update
     delete = CanvasShape.delete
     activate = CanvasShape.activate
@@ -855,6 +1204,14 @@ class CanvasLine(QLine):
         self._color: str = DEFAULT_COLOR
         self._color_name: str | None = None
         self._canvas: CanvasWidget | None = None
+        self._painted_rect: QRect | None = None
+        self._path = QPainterPath()
+        self._path_key: tuple | None = None
+        self._pen: QPen | None = None
+        self._mask = np.zeros((0, 0), dtype=bool)
+        self._mask_key: tuple | None = None
+        self._geometry: tuple | None = None
+        self._geometry_key: tuple | None = None
 
         # Store floating point coords for resizing precision
         self.float_coords = self.getCoords()
@@ -874,21 +1231,20 @@ class CanvasLine(QLine):
         """Move the line's p1 to a new point"""
 
         # Get new coordinates
-        new_p2 = QPoint(p.x() + self.dx(), p.y() + self.dy())
+        x1, y1 = p.x(), p.y()
+        x2, y2 = x1 + self.dx(), y1 + self.dy()
 
         # Validate coordinates
         if self.canvas is not None:
-            new_line = CanvasLine(p, new_p2)
-            x1, y1, x2, y2 = new_line.getCoords()
-            xmin, xmax = sorted([x1, x2])
-            ymin, ymax = sorted([y1, y2])
+            xmin, xmax = (x1, x2) if x1 < x2 else (x2, x1)
+            ymin, ymax = (y1, y2) if y1 < y2 else (y2, y1)
             width, height = self.canvas.width(), self.canvas.height()
             lw = self.linewidth
             if xmin < 0 or ymin < 0 or xmax > (width - lw) or ymax > (height - lw):
                 return
 
         # Move the line and update the canvas
-        self.setPoints(p, new_p2)
+        self.setLine(x1, y1, x2, y2)
         self.update()
 
         # Update float coords
@@ -897,18 +1253,48 @@ class CanvasLine(QLine):
     def normalize(self) -> None:
         """This doesn't do anything but is provided since CanvasShape has it"""
 
+    def path(self) -> QPainterPath:
+        """Get the line as a path, rebuilt only when its endpoints change"""
+        key = self.getCoords()
+        if key != self._path_key:
+            self._path = QPainterPath()
+            self._path.moveTo(QPointF(self.p1()))
+            self._path.lineTo(QPointF(self.p2()))
+            self._path_key = key
+        return self._path
+
+    def pen(self) -> QPen:
+        """Get the pen to draw the shape with, rebuilt only when its color or width changes"""
+        if self._pen is None:
+            self._pen = QPen(self.color)
+            self._pen.setWidth(self.linewidth)
+            self._pen.setCosmetic(True)
+        return self._pen
+
+    def bounding_rect(self, pad: int | None = None) -> QRect:
+        """Get the area of the canvas covered by the line, including its width"""
+        if pad is None:
+            pad = self.linewidth + 1
+        return QRect(self.p1(), self.p2()).normalized().adjusted(-pad, -pad, pad, pad)
+
     def width(self) -> int:
         """Make sure width is always positive"""
-        return abs(super().dx())
+        dx = self.x2() - self.x1()
+        return dx if dx >= 0 else -dx
 
     def height(self) -> int:
         """Make sure height is always positive"""
-        return abs(super().dy())
+        dy = self.y2() - self.y1()
+        return dy if dy >= 0 else -dy
 
     @property
     def kind(self) -> str:
         return "line"
 
+    @property
+    def kind_id(self) -> ShapeKind:
+        return ShapeKind.LINE
+
     @property
     def canvas(self) -> CanvasWidget:
         return self._canvas
@@ -925,6 +1311,7 @@ class CanvasLine(QLine):
     @color.setter
     def color(self, color: str | tuple | QColor) -> None:
         self._color = get_qcolor(color)
+        self._pen = None
 
     @property
     def color_name(self) -> str:
@@ -936,23 +1323,43 @@ class CanvasLine(QLine):
 
     @linewidth.setter
     def linewidth(self, linewidth: int) -> None:
-        self._linewidth = linewidth
-        self.update()
+        if linewidth != self._linewidth:
+            self._linewidth = linewidth
+            self._pen = None
+            self.update()
 
     @property
     def active(self) -> bool:
         return id(self) == id(getattr(self.canvas, "active_shape", self))
 
+    def segment_geometry(self) -> tuple:
+        """Get (x1, y1, dx, dy, 1 / length**2) of the line, recomputed only when it moves"""
+        key = self.getCoords()
+        if key != self._geometry_key:
+            x1, y1, x2, y2 = key
+            dx, dy = x2 - x1, y2 - y1
+            norm = dx * dx + dy * dy
+            self._geometry = (x1, y1, dx, dy, 1.0 / norm if norm else None)
+            self._geometry_key = key
+        return self._geometry
+
     def dist_from_line(self, p: QPoint) -> float:
-        return line_point_dist(self, p)
+        """Get the shortest distance from a point to the line, as in segment_point_dist()"""
+        x1, y1, dx, dy, inv_norm = self.segment_geometry()
+        if inv_norm is None:
+            return 0.0
+        px, py = p.x() - x1, p.y() - y1
+        u = (px * dx + py * dy) * inv_norm
+        u = 1.0 if u > 1 else 0.0 if u < 0 else u
+        return math.hypot(u * dx - px, u * dy - py)
 
     def point_nearby(self, p: QPoint) -> float:
         """Determine if a point is near the line"""
-        return self.dist_from_line(p) < EDGE_PAD
+        return self.near_bounds(p) and self.dist_from_line(p) < EDGE_PAD
 
     def dist_from_p1(self, p: QPoint) -> float:
         """Get the distance from a point to p1 of the line"""
-        return np.sqrt((p.x() - self.x1()) ** 2 + (p.y() - self.y1()) ** 2)
+        return math.hypot(p.x() - self.x1(), p.y() - self.y1())
 
     def near_p1(self, p: QPoint) -> bool:
         """Determine if a point is near p1 of the line"""
@@ -960,7 +1367,7 @@ class CanvasLine(QLine):
 
     def dist_from_p2(self, p: QPoint) -> float:
         """Get the distance from a point to p2 of the line"""
-        return np.sqrt((p.x() - self.x2()) ** 2 + (p.y() - self.y2()) ** 2)
+        return math.hypot(p.x() - self.x2(), p.y() - self.y2())
 
     def near_p2(self, p: QPoint) -> bool:
         """Determine if a point is near p2 of the line"""
@@ -973,35 +1380,79 @@ class CanvasLine(QLine):
         """Determine if a point is near the line (excluding the ends)"""
         return self.point_nearby(p) and not (self.near_p1(p) or self.near_p2(p))
 
+    def distances_from(self, points: np.ndarray) -> np.ndarray:
+        """
+        Get the distances from an (N, 2) array of (x, y) points to each region of the line,
+        as an (N, 3) array with columns in the same order as _LINE_REGIONS.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        px, py = points[:, 0], points[:, 1]
+        x1, y1, x2, y2 = self.getCoords()
+
+        dists = np.empty((len(points), len(_LINE_REGIONS)))
+        dists[:, 0] = np.hypot(px - x1, py - y1)
+        dists[:, 1] = np.hypot(px - x2, py - y2)
+
+        # Distance to the nearest point on the segment, as in segment_point_dist()
+        dx, dy = x2 - x1, y2 - y1
+        norm = dx * dx + dy * dy
+        if norm == 0:
+            dists[:, 2] = 0.0
+        else:
+            u = np.clip(((px - x1) * dx + (py - y1) * dy) / norm, 0.0, 1.0)
+            dists[:, 2] = np.hypot(x1 + u * dx - px, y1 + u * dy - py)
+        return dists
+
+    # Name, proximity test and distance function of each region, in _LINE_REGIONS order
+    _REGION_TABLE = (
+        ("p1", near_p1, dist_from_p1),
+        ("p2", near_p2, dist_from_p2),
+        ("middle", near_middle, dist_from_middle),
+    )
+
+    def near_bounds(self, p: QPoint) -> bool:
+        """Cheaply check if a point is within EDGE_PAD of the line's bounding box"""
+        x1, y1, x2, y2 = self.getCoords()
+        xmin, xmax = (x1, x2) if x1 < x2 else (x2, x1)
+        ymin, ymax = (y1, y2) if y1 < y2 else (y2, y1)
+        px, py = p.x(), p.y()
+        return (
+            xmin - EDGE_PAD < px < xmax + EDGE_PAD and ymin - EDGE_PAD < py < ymax + EDGE_PAD
+        )
+
     def nearby_regions(self, p: QPoint) -> list:
         """Get a list of regions that are near a point"""
-        return [r for r in _LINE_REGIONS if getattr(self, f"near_{r}")(p)]
+        # Most points are nowhere near the line, so skip the distance checks for them
+        if not self.near_bounds(p):
+            return []
+        return [name for name, near, _ in CanvasLine._REGION_TABLE if near(self, p)]
 
-    def nearest_region(self, p: QPoint) -> str | None:
-        """Determine which region of the line is closest to the point"""
-
-        # Get list of nearby regions
-        regions = self.nearby_regions(p)
-        if not regions:
-            return None
+    def nearest_region_id(self, p: QPoint) -> int:
+        """Get the index in _LINE_REGIONS of the region closest to the point, or -1 if none"""
+        if not self.near_bounds(p):
+            return -1
 
-        # Return region if only one is nearby
-        elif len(regions) == 1:
-            return regions[0]
+        # Compute each distance at most once; calling near_middle() would repeat all three.
+        # If either end is nearby, the middle isn't, so the nearer end wins (p1 on a tie).
+        dist_p1, dist_p2 = self.dist_from_p1(p), self.dist_from_p2(p)
+        if dist_p1 < EDGE_PAD or dist_p2 < EDGE_PAD:
+            return 0 if dist_p1 <= dist_p2 else 1
 
-        # Need to determine which region is closest if there are multiple
-        else:
-            # Get distances from the point to each region
-            seps = [(r, getattr(self, f"dist_from_{r}")(p)) for r in regions]
+        # Otherwise the only candidate is the middle of the line
+        return 2 if self.dist_from_middle(p) < EDGE_PAD else -1
 
-            # Get the name of the nearest region
-            return sorted(seps, key=lambda i: i[1])[0][0]
+    def nearest_region(self, p: QPoint) -> str | None:
+        """Determine which region of the line is closest to the point"""
+        region_id = self.nearest_region_id(p)
+        return _LINE_REGIONS[region_id] if region_id >= 0 else None
 
     @property
     def mask(self) -> np.ndarray:
         """
         Get a numpy mask where pixels on the line = True.
         https://stackoverflow.com/a/44874588/10342097
+
+        The mask is reused until the line or canvas changes, so it must not be modified.
         """
 
         # Get dimensions of canvas if it exists, otherwise line dimensions
@@ -1011,40 +1462,14 @@ class CanvasLine(QLine):
             size = self.canvas.size()
             width, height = size.width(), size.height()
 
-        # Create full array of False values with the proper size
-        mask = np.full((height, width), False, dtype=bool)
-
-        # Get endpoints
-        x1, y1, x2, y2 = self.getCoords()
-        x1, x2 = sorted([x1, x2])
-        y1, y2 = sorted([y1, y2])
-
-        # Create linspace of points along the X and Y dimensions
-        num = max(self.width(), self.height()) * 10  # this can probably be optimized
-        x = np.linspace(min(x1, width - 1), min(x2, width - 1), num, endpoint=False)
-        y = np.linspace(min(y1, height - 1), min(y2, height - 1), num, endpoint=False)
-
-        # Mask values along the line
-        mask[y.astype(np.int), x.astype(np.int)] = True
-        return mask
-
-    def rescale(self, old: QSize, new: QSize) -> None:
-        """Scale the line when the canvas changes"""
-
-        # Get the scale factors
-        w0, h0 = old.width(), old.height()
-        w1, h1 = new.width(), new.height()
-        w_scale, h_scale = (w1 / max(w0, 1)), (h1 / max(h0, 1))
-
-        # Work in floating point to avoid rounding problems
-        x1, y1, x2, y2 = self.float_coords
-        x1_new, x2_new = (x1 * w_scale), (x2 * w_scale)
-        y1_new, y2_new = (y1 * h_scale), (y2 * h_scale)
-        self.float_coords = x1_new, y1_new, x2_new, y2_new
-
-        # Rescale the shape
-        self.setCoords(int(x1_new), int(y1_new), int(x2_new), int(y2_new))
-        self.update()
+        # Reuse the last mask if nothing has changed
+        coords = self.getCoords()
+        key = (*coords, width, height)
+        if key != self._mask_key:
+            # Mask the pixels along the line
+            self._mask = rasterize_line(*coords, np.zeros((height, width), dtype=bool))
+            self._mask_key = key
+        return self._mask
 
     def resize(self, region: str, p: QPoint) -> None:
         """Resize the line using the mouse"""
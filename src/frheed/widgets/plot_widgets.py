@@ -2,13 +2,16 @@
 Widgets for plotting data in PyQt.
 """
 
+import importlib.util
 import logging
+from functools import cached_property
 
 import numpy as np
 import pyqtgraph as pg  # import *after* PyQt6
-from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot
-from PyQt6.QtGui import QAction, QColor, QPixmap
+from PyQt6.QtCore import QObject, Qt, QThread, pyqtSignal, pyqtSlot
+from PyQt6.QtGui import QAction, QColor, QPen, QPixmap
 from PyQt6.QtWidgets import (
+    QApplication,
     QCheckBox,
     QDoubleSpinBox,
     QGraphicsPixmapItem,
@@ -21,9 +24,9 @@ from PyQt6.QtWidgets import (
 )
 
 import frheed.utils as utils
-from frheed.calcs import apply_cutoffs, calc_fft, detect_peaks
-from frheed.image_processing import apply_cmap, ndarray_to_qpixmap
-from frheed.widgets.camera_widget import DEFAULT_CMAP
+from frheed.calcs import apply_cutoffs, calc_ffts, detect_peaks
+from frheed.image_processing import apply_cmap, ndarray_to_qpixmap, norm_scratch
+from frheed.widgets.camera_widget import DEFAULT_CMAP, SampleSeries
 from frheed.widgets.common_widgets import HSpacer, VisibleSplitter
 
 # https://pyqtgraph.readthedocs.io/en/latest/_modules/pyqtgraph.html?highlight=setConfigOption
@@ -56,17 +59,86 @@ _PG_AXES = ("left", "bottom", "right", "top")
 _AXIS_COLOR = QColor("black")
 _DEFAULT_SIZE = (800, 600)
 _MIN_FFT_PEAK_POS = 0.5
+_FFT_WINDOW = 4096  # maximum number of (most recent) samples passed to the FFT
+_SERIES_CAPACITY = 65536  # maximum number of samples kept for a live time series
 _CURVE_MENU_TITLE = "View Lines"
 _ITALIC_COORDS = True
 
+# pyqtgraph can only draw with OpenGL if PyOpenGL (an optional pyqtgraph dependency) is installed
+_HAVE_OPENGL = importlib.util.find_spec("OpenGL") is not None
 
-def init_pyqtgraph(use_opengl: bool = False) -> None:
-    """Set up the pyqtgraph configuration options"""
-    for k, v in _PG_CFG.items():
+# Whether the pyqtgraph config options have already been applied
+_pg_initialized = False
+
+
+def init_pyqtgraph(use_opengl: bool | None = None) -> None:
+    """
+    Set up the pyqtgraph configuration options (only once per session). Curves are drawn with
+    OpenGL if 'use_opengl' is True, or if it is None and PyOpenGL is installed.
+    """
+    global _pg_initialized
+    if _pg_initialized:
+        return
+
+    # OpenGL curve drawing is part of pyqtgraph's experimental features
+    use_opengl = _HAVE_OPENGL if use_opengl is None else use_opengl
+    cfg = {**_PG_CFG, "useOpenGL": use_opengl, "enableExperimental": use_opengl}
+    for k, v in cfg.items():
         try:
             pg.setConfigOption(k, v)
         except Exception:
             logging.exception("Failed to set pyqtgraph config %s = %s", k, v)
+    _pg_initialized = True
+
+
+class SeriesBuffer:
+    """
+    Preallocated x/y arrays for a live curve that grows one sample at a time.
+
+    The source data is the full history (e.g. series kept by the analysis worker), but only the
+    samples that haven't been seen yet are copied in on each update. Once the buffer is full,
+    the oldest half is discarded.
+    """
+
+    def __init__(self, capacity: int = _SERIES_CAPACITY) -> None:
+        # float64 matches the QPointF layout pyqtgraph builds curve paths from, so it isn't
+        # converted
+        self.x = np.empty(capacity, dtype=np.float64)
+        self.y = np.empty(capacity, dtype=np.float64)
+        self.size = 0  # number of valid samples in the arrays
+        self.consumed = 0  # number of source samples already copied
+
+    def update(
+        self, x: list | np.ndarray | SampleSeries, y: list | np.ndarray | SampleSeries
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Copy any new (x, y) pairs into the buffer and return views of the valid data"""
+        # Only pairs are plotted, as with utils.snip_lists
+        n = min(len(x), len(y))
+
+        # Start over if the source data has been reset
+        if n < self.consumed:
+            self.size = self.consumed = 0
+
+        # Make room for the new samples by dropping the oldest ones
+        new = n - self.consumed
+        capacity = len(self.x)
+        if self.size + new > capacity:
+            keep = max(min(self.size, capacity // 2, capacity - new), 0)
+            start = self.size - keep
+            self.x[:keep] = self.x[start : self.size]
+            self.y[:keep] = self.y[start : self.size]
+            self.size = keep
+
+        # Copy the new samples (only as many as will fit)
+        count = min(new, capacity - self.size)
+        if count > 0:
+            end = self.size + count
+            self.x[self.size : end] = x[n - count : n]
+            self.y[self.size : end] = y[n - count : n]
+            self.size = end
+        self.consumed = n
+
+        return self.x[: self.size], self.y[: self.size]
 
 
 class PlotWidget(QWidget):
@@ -180,61 +252,86 @@ class PlotWidget(QWidget):
     def axes(self) -> list:
         return [getattr(self, ax) for ax in _PG_AXES]
 
+    def _color_key(self, color: QColor | str | tuple) -> str:
+        """Get the plot_items key for a color, skipping the QColor round-trip for known keys."""
+        if isinstance(color, str) and color in self.plot_items:
+            return color
+        return utils.get_qcolor(color).name()
+
     def get_curve(self, color: QColor | str | tuple) -> pg.PlotCurveItem:
         """Get an existing plot item."""
-        color = utils.get_qcolor(color)
-        return self.plot_items.get(color.name())
+        return self.plot_items.get(self._color_key(color))
 
     @pyqtSlot(str)
     def add_curve(self, color: QColor | str | tuple) -> pg.PlotCurveItem:
         """Add a curve to the plot."""
         # Raise error if curve already exists
-        color = utils.get_qcolor(color)
-        if self.plot_items.get(color.name()) is not None:
-            raise AttributeError(f"{color.name()} curve already exists.")
+        key = self._color_key(color)
+        if self.plot_items.get(key) is not None:
+            raise AttributeError(f"{key} curve already exists.")
 
         # Create curve (named after the color hex) and return it
-        pen = utils.get_qpen(color, cosmetic=True)
-        curve = pg.PlotCurveItem(pen=pen, name=color.name())
-        self.plot_items[color.name()] = curve
+        pen = utils.get_qpen(key, cosmetic=True)
+        curve = self._create_curve(pen, key)
+        self.plot_items[key] = curve
         self.plot_item.addItem(curve)
 
         # Emit curve_added and connect data update signal so FFT can update
-        self.curve_added.emit(color.name())
-        curve.sigPlotChanged.connect(lambda c: self.data_changed.emit(color.name()))
+        self.curve_added.emit(key)
+        curve.sigPlotChanged.connect(lambda c: self.data_changed.emit(key))
 
         # Create action in curve_menu
-        self.add_curve_menu_action(color.name())
+        self.add_curve_menu_action(key)
 
         return curve
 
+    def _create_curve(self, pen: QPen, name: str) -> pg.PlotCurveItem:
+        """Create the item used to draw a curve on this plot."""
+        return pg.PlotCurveItem(pen=pen, name=name)
+
     @pyqtSlot(str)
     def get_or_add_curve(self, color: QColor | str | tuple) -> pg.PlotCurveItem:
         """Get a curve or add it if it doesn't exist."""
         # Return curve if it already exists
-        color = utils.get_qcolor(color)
-        if self.plot_items.get(color.name()) is not None:
-            return self.get_curve(color)
+        key = self._color_key(color)
+        curve = self.plot_items.get(key)
+        if curve is not None:
+            return curve
 
         # Create curve
-        return self.add_curve(color)
+        return self.add_curve(key)
 
     @pyqtSlot(str)
     def remove_curve(self, color: QColor | str | tuple) -> None:
         """Remove a curve from the plot."""
         # Remove the curve from the plot
-        color = utils.get_qcolor(color)
-        self.plot_item.removeItem(self.get_curve(color))
+        key = self._color_key(color)
+        self.plot_item.removeItem(self.plot_items.get(key))
 
         # Remove from storage
-        self.plot_items.pop(color.name(), None)
+        self.plot_items.pop(key, None)
 
         # Remove action from menu
-        action = self._get_menu_action(color.name())
+        action = self._get_menu_action(key)
         action.setParent(None) if action is not None else None
 
         # Emit curve_removed so FFT can update
-        self.curve_removed.emit(color.name())
+        self.curve_removed.emit(key)
+
+    def fit_view(self) -> None:
+        """Fit the view to the data once, keeping any axis that follows the data automatically"""
+        auto_x, auto_y = self.plot_item.getViewBox().autoRangeEnabled()
+        self.plot_item.autoRange()
+        self.plot_item.enableAutoRange(x=auto_x, y=auto_y)
+
+    def fit_first_data(self) -> None:
+        """Fit the view once the next data is plotted, for plots that don't auto-range"""
+        self.data_changed.connect(self._fit_first_data)
+
+    @pyqtSlot(str)
+    def _fit_first_data(self, color: str) -> None:
+        self.data_changed.disconnect(self._fit_first_data)
+        self.fit_view()
 
     @pyqtSlot(object)
     def show_cursor_position(self, event: object) -> None:
@@ -393,6 +490,81 @@ class LinePlotWidget(PlotWidget):
         # TODO
 
 
+class FFTWorker(QObject):
+    """
+    A worker object that computes FFTs away from the GUI thread. Only the most recent data
+    submitted for each color is processed; older data that is still waiting is replaced.
+    """
+
+    # color, frequencies, PSD, peak positions (None if not detected)
+    fft_ready = pyqtSignal(str, object, object, object)
+    _requested = pyqtSignal()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._inbox: dict[str, tuple] = {}
+        self._scheduled = False
+        self._requested.connect(self._process_inbox)
+
+    def submit(
+        self,
+        color: str,
+        x: np.ndarray,
+        y: np.ndarray,
+        low_freq_cutoff: float | None,
+        autofind_peaks: bool,
+    ) -> None:
+        """Queue data for a color (from any thread); the arrays must not be modified afterwards"""
+        self._inbox[color] = (x, y, low_freq_cutoff, autofind_peaks)
+        if not self._scheduled:
+            self._scheduled = True
+            self._requested.emit()
+
+    @pyqtSlot()
+    def _process_inbox(self) -> None:
+        # Clear the flag first so data submitted while processing schedules another pass
+        self._scheduled = False
+        while self._inbox:
+            # Regions sampled over the same frames share their x values, so their data is
+            # grouped and each group is transformed in a single batched FFT
+            groups: list[tuple[np.ndarray, list[tuple]]] = []
+            while self._inbox:
+                try:
+                    color, (x, y, low_freq_cutoff, autofind_peaks) = self._inbox.popitem()
+                except KeyError:
+                    break
+                x, y = utils.snip_lists(x, y)
+                entry = (color, y, low_freq_cutoff, autofind_peaks)
+                for group_x, entries in groups:
+                    if np.array_equal(group_x, x):
+                        entries.append(entry)
+                        break
+                else:
+                    groups.append((x, [entry]))
+
+            for x, entries in groups:
+                # Try to compute the FFTs
+                freq, psds = calc_ffts(x, np.stack([y for _, y, *_ in entries]))
+                if freq is None or psds is None:
+                    continue
+
+                for (color, _, low_freq_cutoff, autofind_peaks), psd in zip(entries, psds):
+                    # Skip only the series whose FFT couldn't be computed
+                    if np.isnan(psd[0]):
+                        continue
+
+                    # Cutoff low frequency peak
+                    freq_cut, psd = apply_cutoffs(
+                        x=freq, y=psd, minval=low_freq_cutoff, maxval=None
+                    )
+
+                    # Find peak positions, if option is selected
+                    peaks = (
+                        detect_peaks(freq_cut, psd, _MIN_FFT_PEAK_POS) if autofind_peaks else None
+                    )
+                    self.fft_ready.emit(color, freq_cut, psd, peaks)
+
+
 class FFTPlotWidget(PlotWidget):
     """Widget for showing FFT data from another plot."""
 
@@ -426,18 +598,34 @@ class FFTPlotWidget(PlotWidget):
         # Update axes
         self.bottom.setLabel("Frequency", units="Hz")
 
+        # Compute the FFTs in a separate thread
+        self._fft_worker = FFTWorker()
+        self._fft_thread = QThread(self)
+        self._fft_worker.moveToThread(self._fft_thread)
+        self._fft_worker.fft_ready.connect(self.show_fft)
+        self._fft_thread.start()
+        QApplication.instance().aboutToQuit.connect(self.stop_fft_thread)
+
+    def closeEvent(self, event) -> None:
+        self.stop_fft_thread()
+        super().closeEvent(event)
+
+    @pyqtSlot()
+    def stop_fft_thread(self) -> None:
+        """Stop the FFT thread; this must be called before the widget is deleted"""
+        self._fft_thread.quit()
+        self._fft_thread.wait()
+
     @pyqtSlot(str)
     def plot_fft(self, color: str) -> None:
         # Don't plot if the curve is not visible, and hide all vertical lines
         fft_curve = self.get_curve(color)
         if not fft_curve.isVisible():
-            [self.plot_item.removeItem(line) for line in self.vlines.get(color, [])]
+            lines = self.vlines.pop(self._color_key(color), [])
+            [self.plot_item.removeItem(line) for line in lines]
             return
 
-        # Get QColor
-        color = utils.get_qcolor(color)
-
-        # Get parent & FFT curves
+        # Get parent curve
         parent_curve = self._parent.get_curve(color)
 
         # Get curve data
@@ -447,14 +635,22 @@ class FFTPlotWidget(PlotWidget):
         minval, maxval = self._parent.fft_bounds
         x, y = apply_cutoffs(x=x, y=y, minval=minval, maxval=maxval)
 
-        # Try to compute FFT
-        # NOTE: If data isn't copied, it will mess with the original curve data
-        freq, psd = calc_fft(x.copy(), y.copy())
-        if freq is None or psd is None:
-            return
+        # Only use the most recent samples so the cost doesn't grow with the acquisition length
+        x, y = x[-_FFT_WINDOW:], y[-_FFT_WINDOW:]
 
-        # Cutoff low frequency peak
-        freq, psd = self._cutoff_low_freq(freq, psd)
+        # Compute the FFT in the worker thread. The curve data may be overwritten while it waits,
+        # so hand it a copy (which is bounded by the FFT window).
+        self._fft_worker.submit(
+            color, np.array(x), np.array(y), self.low_freq_cutoff, self.autofind_peaks
+        )
+
+    @pyqtSlot(str, object, object, object)
+    def show_fft(self, color: str, freq: np.ndarray, psd: np.ndarray, peaks: list | None) -> None:
+        """Show an FFT computed by the worker thread"""
+        # The curve may have been removed while the FFT was being computed
+        fft_curve = self.get_curve(color)
+        if fft_curve is None:
+            return
 
         # Update corresponding curve data
         try:
@@ -462,8 +658,8 @@ class FFTPlotWidget(PlotWidget):
         except RuntimeError:
             pass
 
-        # Show peak positions, if option is selected
-        self.detect_and_show_peaks(freq, psd, color.name()) if self.autofind_peaks else None
+        # Show peak positions, if they were found
+        self.show_peaks(peaks, color) if peaks is not None else None
 
     @pyqtSlot(str, bool)
     def toggle_vlines(self, color: str, visible: bool) -> None:
@@ -475,23 +671,29 @@ class FFTPlotWidget(PlotWidget):
         peak_positions = detect_peaks(x, y, _MIN_FFT_PEAK_POS)
         if peak_positions is None:
             return
+        self.show_peaks(peak_positions, color)
 
-        # Clear vlines for current color
+    def show_peaks(self, peak_positions: list, color: str | None = None) -> None:
+        # Move the existing vlines for the current color to the new peaks, since the peaks
+        # usually stay put between updates, and only remove or add lines if the count changed
+        lines = []
         if color is not None:
-            color = utils.get_qcolor(color).name()
+            color = self._color_key(color)
             lines = self.vlines.get(color, [])
-            [self.plot_item.removeItem(line) for line in lines]
+            for line, x in zip(lines, peak_positions):
+                if line.value() != x:
+                    line.setValue(x)
+            [self.plot_item.removeItem(line) for line in lines[len(peak_positions) :]]
+            lines = lines[: len(peak_positions)]
 
         # Add lines
-        pen = pg.mkPen()
-        pen.setStyle(Qt.DashLine)
-        pen.setColor(utils.get_qcolor(color)) if color is not None else None
-        new_lines = [self.plot_item.addLine(x=x, pen=pen) for x in peak_positions]
+        if len(peak_positions) > len(lines):
+            pen = pg.mkPen()
+            pen.setStyle(Qt.DashLine)
+            pen.setColor(utils.get_qcolor(color)) if color is not None else None
+            lines += [self.plot_item.addLine(x=x, pen=pen) for x in peak_positions[len(lines) :]]
         if color is not None:
-            self.vlines[color] = new_lines
-
-    def _cutoff_low_freq(self, x: list, y: list) -> tuple:
-        return apply_cutoffs(x=x, y=y, minval=self.low_freq_cutoff, maxval=None)
+            self.vlines[color] = lines
 
 
 class LineProfileWidget(PlotWidget):
@@ -513,6 +715,16 @@ class LineProfileWidget(PlotWidget):
         self.bottom.setLabel("Position")
         self.left.setLabel("Intensity (Counts)")
 
+    def _create_curve(self, pen: QPen, name: str) -> pg.PlotDataItem:
+        """
+        Create a curve that is reduced to the visible pixel width before drawing. A profile can be
+        thousands of pixels long; 'peak' downsampling keeps the diffraction peaks visible.
+        """
+        curve = pg.PlotDataItem(pen=pen, name=name)
+        curve.setDownsampling(auto=True, method="peak")
+        curve.setClipToView(True)
+        return curve
+
 
 class LineScanPlotWidget(PlotWidget):
     """Widget for displaying linear profile as a 2D time series"""
@@ -537,6 +749,7 @@ class LineScanPlotWidget(PlotWidget):
         # TODO: Handle line scans from multiple different lines
         self._image: np.ndarray | None = None
         self._pixmap_item: QGraphicsPixmapItem | None = None
+        self._norm_scratch: np.ndarray | None = None
 
     @property
     def image(self) -> np.ndarray | None:
@@ -545,7 +758,8 @@ class LineScanPlotWidget(PlotWidget):
     @image.setter
     def image(self, image: np.ndarray) -> None:
         # Apply colormap
-        cmapped = apply_cmap(image, DEFAULT_CMAP)
+        self._norm_scratch = norm_scratch(image, self._norm_scratch)
+        cmapped = apply_cmap(image, DEFAULT_CMAP, scratch=self._norm_scratch)
 
         # Update pixmap
         self.pixmap = ndarray_to_qpixmap(cmapped)
@@ -646,6 +860,10 @@ class PlotGridWidget(QWidget):
         self.menubar = QMenuBar(self)
         self.menubar.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Maximum)
         self.curve_menu = self.menubar.addMenu(_CURVE_MENU_TITLE)
+        self.view_menu = self.menubar.addMenu("View")
+        self.growth_rate_item = self.view_menu.addAction("Growth Rate")
+        self.growth_rate_item.setCheckable(True)
+        self.growth_rate_item.toggled.connect(self.show_growth_rate_plot)
 
         # Create controls buttons
         self.start_button = QPushButton("Start")  # TODO: Add icon
@@ -663,9 +881,6 @@ class PlotGridWidget(QWidget):
         self.region_fft_plot = FFTPlotWidget(
             parent=self.region_plot, popup=False, title="Region Intensity FFT", show_menubar=False
         )
-        self.growth_rate_plot = GrowthRatePlotWidget(
-            parent=self.region_fft_plot, popup=False, title="Growth Rate", show_menubar=False
-        )
         self.profile_plot = LineProfileWidget(
             parent=self, popup=False, title="1D Line Profile", show_menubar=False
         )
@@ -677,7 +892,6 @@ class PlotGridWidget(QWidget):
         self.plot_widgets = [
             self.region_plot,
             self.region_fft_plot,
-            self.growth_rate_plot,
             self.profile_plot,
             # self.profile_fft_plot,
             self.line_scan_plot,
@@ -702,7 +916,7 @@ class PlotGridWidget(QWidget):
         self.main_splitter.addWidget(self.profile_plots_splitter)
         [
             self.region_plots_splitter.addWidget(w)
-            for w in (self.region_plot, self.region_fft_plot, self.growth_rate_plot)
+            for w in (self.region_plot, self.region_fft_plot)
         ]
         [self.profile_plots_splitter.addWidget(w) for w in (self.profile_plot, self.line_scan_plot)]
 
@@ -710,6 +924,13 @@ class PlotGridWidget(QWidget):
         for widget in self.plot_widgets:
             widget.curve_toggled.connect(self.toggle_all_curves)
 
+        # Don't recompute the view ranges on every update; fit each plot to its first data, then
+        # use reset_views() to fit them again. The region plot keeps following the latest time.
+        for widget in self.plot_widgets:
+            widget.plot_item.disableAutoRange()
+            widget.fit_first_data()
+        self.region_plot.plot_item.enableAutoRange(axis=pg.ViewBox.XAxis)
+
         # Resize splitter
         self.main_splitter.setSizes([350, 350])
 
@@ -726,6 +947,38 @@ class PlotGridWidget(QWidget):
         self.closed.emit()
         super().closeEvent(event)
 
+    def stop_threads(self) -> None:
+        """Stop the plots' worker threads before the widget is deleted"""
+        [w.stop_fft_thread() for w in self.plot_widgets if isinstance(w, FFTPlotWidget)]
+
+    @cached_property
+    def growth_rate_plot(self) -> GrowthRatePlotWidget:
+        """The growth rate plot, which is only created the first time it is shown"""
+        plot = GrowthRatePlotWidget(
+            parent=self.region_fft_plot, popup=False, title="Growth Rate", show_menubar=False
+        )
+        plot.curve_menu = self.curve_menu
+        plot.curve_toggled.connect(self.toggle_all_curves)
+        plot.plot_item.disableAutoRange()
+        plot.fit_first_data()
+
+        # Growth rate and region intensity share the time axis, so pan and zoom them together
+        plot.plot_widget.setXLink(self.region_plot.plot_widget)
+        self.plot_widgets.append(plot)
+        self.region_plots_splitter.addWidget(plot)
+        return plot
+
+    @pyqtSlot(bool)
+    def show_growth_rate_plot(self, visible: bool) -> None:
+        # Don't create the plot just to hide it
+        if visible or "growth_rate_plot" in self.__dict__:
+            self.growth_rate_plot.setVisible(visible)
+
+    @pyqtSlot()
+    def reset_views(self) -> None:
+        """Fit each plot's view to its current data once"""
+        [w.fit_view() for w in self.plot_widgets]
+
     @pyqtSlot(str, bool)
     def toggle_all_curves(self, color: str, visible: bool) -> None:
         [wid.toggle_curve(color, visible, block_signal=True) for wid in self.plot_widgets]
@@ -4,19 +4,23 @@ Widgets for RHEED analysis.
 
 from __future__ import annotations
 
+import math
 import os
 
-from PyQt6.QtCore import pyqtSlot
+import pyqtgraph as pg
+from PyQt6.QtCore import QTimer, pyqtSlot
 from PyQt6.QtGui import QAction, QCloseEvent, QResizeEvent
 from PyQt6.QtWidgets import QGridLayout, QMenu, QMenuBar, QMessageBox, QSizePolicy, QWidget
 
 from frheed.constants import CONFIG_DIR, DATA_DIR
-from frheed.utils import snip_lists
 from frheed.widgets.camera_widget import VideoWidget
 from frheed.widgets.canvas_widget import CanvasLine, CanvasShape
-from frheed.widgets.plot_widgets import PlotGridWidget
+from frheed.widgets.plot_widgets import PlotGridWidget, SeriesBuffer
 from frheed.widgets.selection_widgets import CameraSelection
 
+# Live plots are redrawn at most this often, regardless of the camera frame rate
+_PLOT_INTERVAL = 33  # ms, about 30 Hz
+
 
 class RHEEDWidget(QWidget):
     def __init__(self, parent: QWidget | None = None):
@@ -56,6 +60,7 @@ class RHEEDWidget(QWidget):
         self.show_live_plots_item.setChecked(True)
         self.show_live_plots_item.toggled.connect(self.show_live_plots)
         self.view_menu.addAction(self.show_live_plots_item)
+        self.view_menu.addAction("&Reset plot views", self.reset_plot_views)
         self.menubar.addMenu(self.view_menu)
 
         # "Tools" menu
@@ -69,9 +74,17 @@ class RHEEDWidget(QWidget):
         # Create camera selection widget and wait for choice
         self.setVisible(False)
         self.cam_selection = CameraSelection()
-        self.cam_selection.camera_selected.connect(self._init_ui)
+        self.cam_selection.camera_selected.connect(self._camera_selected)
         self.cam_selection.raise_()
 
+    @pyqtSlot()
+    def _camera_selected(self) -> None:
+        """Build the UI for the first camera selected, and switch cameras after that."""
+        if self._initialized:
+            self.change_camera()
+        else:
+            self._init_ui()
+
     @pyqtSlot()
     def _init_ui(self) -> None:
         """Finish UI setup after selecting a camera."""
@@ -96,6 +109,19 @@ class RHEEDWidget(QWidget):
         self.profile_plot = self.plot_grid.profile_plot
         self.line_scan_plot = self.plot_grid.line_scan_plot
 
+        # Curve for each shape color, created when the shape is drawn, along with the buffer of
+        # plotted (time, average) samples for regions, or None for lines (which plot a profile)
+        self._curves: dict[str, tuple[pg.PlotCurveItem, SeriesBuffer | None]] = {}
+
+        # Whether the live plots exist and are shown, so they should be updated
+        self._plots_alive = True
+
+        # The plots pull the latest analysis data on a timer rather than on every frame
+        self._plotted_frame = -1
+        self._plot_timer = QTimer(self)
+        self._plot_timer.setInterval(_PLOT_INTERVAL)
+        self._plot_timer.timeout.connect(self._plot_latest_data)
+
         # Add widgets to layout
         layout = self.layout()
         if not isinstance(layout, QGridLayout):
@@ -108,14 +134,13 @@ class RHEEDWidget(QWidget):
         layout.setColumnStretch(0, 1)
 
         # Connect signals
-        self.camera_widget.analysis_worker.data_ready.connect(self.plot_data)
+        self.camera_widget.display.canvas.shape_added.connect(self.add_line)
         self.camera_widget.display.canvas.shape_deleted.connect(self.remove_line)
         self.plot_grid.closed.connect(self.live_plots_closed)
         self.camera_widget.display.canvas.shape_deleted.connect(self.plot_grid.remove_curves)
 
-        # Reconnect camera_selected signal
-        self.cam_selection.camera_selected.disconnect()
-        self.cam_selection.camera_selected.connect(self.change_camera)
+        # Start plotting
+        self._plot_timer.start()
 
         # Mark as initialized
         self._initialized = True
@@ -125,13 +150,23 @@ class RHEEDWidget(QWidget):
 
     def closeEvent(self, event: QCloseEvent | None) -> None:
         if self._initialized:
-            [
+            # Stop plotting before the plots are torn down
+            self._plots_alive = False
+            self._plot_timer.stop()
+
+            # Deleting the plots doesn't close them, so their threads have to be stopped here
+            self.plot_grid.stop_threads()
+            for wid in (self.region_plot, self.profile_plot, self.plot_grid):
                 wid.setParent(None)
-                for wid in [self.region_plot, self.profile_plot, self, self.plot_grid]
-            ]
+                wid.deleteLater()
             self.camera_widget.closeEvent(event)
         self.cam_selection.close()
 
+    @pyqtSlot()
+    def reset_plot_views(self) -> None:
+        if self._initialized:
+            self.plot_grid.reset_views()
+
     @pyqtSlot()
     def open_data_folder(self) -> None:
         self._try_open(DATA_DIR)
@@ -140,35 +175,79 @@ class RHEEDWidget(QWidget):
     def open_settings_folder(self) -> None:
         self._try_open(CONFIG_DIR)
 
+    @pyqtSlot()
+    def _plot_latest_data(self) -> None:
+        """Plot the most recent analysis data, if there is any that hasn't been plotted"""
+        if not self._plots_alive:
+            return
+
+        # Nothing can be seen while the plot window is minimized, so leave the data to be caught
+        # up on once it is restored
+        if self.plot_grid.isMinimized():
+            return
+        frame_count, data = self.camera_widget.analysis_worker.get_snapshot()
+        if frame_count != self._plotted_frame:
+            self._plotted_frame = frame_count
+            self.plot_data(data)
+
     @pyqtSlot(dict)
     def plot_data(self, data: dict) -> None:
         """Plot data from the camera"""
+        if not self._plots_alive:
+            return
+
+        # Repaint each plot once, after all of its curves have been updated
+        views = (self.region_plot.plot_widget, self.profile_plot.plot_widget)
+        for view in views:
+            view.setUpdatesEnabled(False)
+        try:
+            self._update_curves(data)
+        finally:
+            for view in views:
+                view.setUpdatesEnabled(True)
+
+    def _update_curves(self, data: dict) -> None:
+        """Update the live plot curves with data from the camera"""
         # Get data for each color in the data dictionary
+        # NOTE: The data are pixel values and their averages, so pyqtgraph can skip its NaN check
+        latest_time = -math.inf
         for color, color_data in data.items():
-            # Add region data to the region plot
-            if color_data["kind"] in ["rectangle", "ellipse"]:
-                curve = self.region_plot.get_or_add_curve(color)
-
-                # Catch RuntimeError if widget has been closed
-                try:
-                    curve.setData(*snip_lists(color_data["time"], color_data["average"]))
-                except RuntimeError:
-                    pass
+            # Curves are created when shapes are added, so a missing curve means that the shape
+            # was deleted after the worker started analyzing the frame
+            entry = self._curves.get(color)
+            if entry is None:
+                continue
+            curve, series = entry
 
             # Add line profile data to the profile plot and update line scan
-            elif color_data["kind"] == "line":
-                curve = self.profile_plot.get_or_add_curve(color)
-                try:
-                    curve.setData(color_data["y"][-1])
-                except RuntimeError:
-                    pass
+            if series is None:
+                curve.setData(color_data["y"][-1], skipFiniteCheck=True)
 
                 # Update 2D line scan image
                 self.line_scan_plot.set_image(color_data["image"])
 
-            # Update region window
-            if self.region_plot.auto_fft_max:
-                self.region_plot.set_fft_max(color_data["time"][-1])
+            # Add region data to the region plot and track the latest region sample time
+            else:
+                x, y = series.update(color_data["time"], color_data["average"])
+                curve.setData(x, y, skipFiniteCheck=True)
+                if len(x) != 0 and x[-1] > latest_time:
+                    latest_time = x[-1]
+
+        # Update region window once for all regions
+        if latest_time > -math.inf and self.region_plot.auto_fft_max:
+            self.region_plot.set_fft_max(latest_time)
+
+    def _get_or_add_curve(self, color: str, kind: str) -> tuple:
+        """Get the curve (and sample buffer, for regions) for a shape color"""
+        plot = self.profile_plot if kind == "line" else self.region_plot
+        series = None if kind == "line" else SeriesBuffer()
+        entry = self._curves[color] = (plot.get_or_add_curve(color), series)
+        return entry
+
+    @pyqtSlot(object)
+    def add_line(self, shape: CanvasShape | CanvasLine) -> None:
+        """Create the plot curve for a new shape so plot_data only has to update it"""
+        self._get_or_add_curve(shape.color_name, shape.kind)
 
     @pyqtSlot(object)
     def remove_line(self, shape: CanvasShape | CanvasLine) -> None:
@@ -177,8 +256,9 @@ class RHEEDWidget(QWidget):
         plot = self.profile_plot if shape.kind == "line" else self.region_plot
 
         # Remove the line
+        self._curves.pop(shape.color_name, None)
         plot.plot_widget.removeItem(plot.plot_items.pop(shape.color_name))
-        self.camera_widget.analysis_worker.data.pop(shape.color_name)
+        self.camera_widget.analysis_worker.data.pop(shape.color_name, None)
 
     @pyqtSlot()
     def show_cam_selection(self) -> None:
@@ -198,6 +278,9 @@ class RHEEDWidget(QWidget):
 
     @pyqtSlot(bool)
     def show_live_plots(self, visible: bool) -> None:
+        # Hidden plots aren't updated; the region buffers catch up from the history when shown
+        self._plots_alive = visible
+        self._plot_timer.start() if visible else self._plot_timer.stop()
         self.plot_grid.setVisible(visible)
 
     def _try_open(self, path: str) -> None:
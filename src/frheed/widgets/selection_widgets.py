@@ -2,11 +2,13 @@
 Widgets for selecting things, including the source camera to use.
 """
 
+import logging
+import time
 from collections.abc import Callable
 from dataclasses import dataclass
 from enum import Enum
 
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import QObject, QRunnable, Qt, QThreadPool, pyqtSignal, pyqtSlot
 from PyQt6.QtWidgets import QGridLayout, QPushButton, QWidget
 
 from frheed.cameras.flir import FlirCamera
@@ -15,6 +17,9 @@ from frheed.cameras.usb import UsbCamera
 from frheed.cameras.usb import get_available_cameras as get_usb_cams
 from frheed.utils import get_icon
 
+# How long (in seconds) the list of available cameras is reused before probing again
+_PROBE_TTL = 5.0
+
 
 class CameraClasses(Enum):
     flir = FlirCamera
@@ -31,10 +36,47 @@ class CameraObject:
         return self.cam_class(src=self.src)
 
 
+def probe_usb_cameras() -> list[CameraObject]:
+    return [CameraObject(UsbCamera, src, name) for src, name in get_usb_cams().items()]
+
+
+def probe_flir_cameras() -> list[CameraObject]:
+    return [CameraObject(FlirCamera, src, name) for src, name in get_flir_cams().items()]
+
+
+# Functions used to find each type of camera, in the order their buttons are listed
+_CAMERA_PROBES = {"usb": probe_usb_cameras, "flir": probe_flir_cameras}
+
+
+class _ProbeSignals(QObject):
+    finished = pyqtSignal(str, list)
+
+
+class _ProbeTask(QRunnable):
+    """Find the cameras of one type in a thread pool thread"""
+
+    def __init__(self, name: str, probe: Callable[[], list[CameraObject]]) -> None:
+        super().__init__()
+        self.name = name
+        self.probe = probe
+        self.signals = _ProbeSignals()
+
+    def run(self) -> None:
+        try:
+            cams = self.probe()
+        except Exception:
+            logging.exception("Failed to find %s cameras", self.name)
+            cams = []
+        self.signals.finished.emit(self.name, cams)
+
+
 class CameraSelection(QWidget):
     camera_classes = (FlirCamera, UsbCamera)
     camera_selected = pyqtSignal()
 
+    # (time of probe, cameras found), shared by all selection windows
+    _probe_cache: tuple[float, list[CameraObject]] | None = None
+
     def __init__(self) -> None:
         super().__init__(None)
 
@@ -44,9 +86,6 @@ class CameraSelection(QWidget):
         # Reference to Camera object that will be instantiated later
         self._cam: FlirCamera | UsbCamera | None = None
 
-        # Check for available cameras
-        cams = self.available_cameras()
-
         # Set window properties
         self.setWindowFlags(Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.Window)
         self.setWindowTitle("Select Camera")
@@ -59,37 +98,83 @@ class CameraSelection(QWidget):
         layout = QGridLayout()
         self.setLayout(layout)
 
+        # Show a placeholder until the cameras have been found
+        self._status_button = QPushButton("Searching for cameras...")
+        self._status_button.setEnabled(False)
+        layout.addWidget(self._status_button, 0, 0)
+
+        # Use recently found cameras, or look for each type of camera at the same time
+        # without blocking the GUI
+        self._probe_results: dict[str, list[CameraObject]] = {}
+        self._probe_tasks: list[_ProbeTask] = []
+        cams = self._cached_cameras()
+        if cams is not None:
+            self._add_camera_buttons(cams)
+        else:
+            for name, probe in _CAMERA_PROBES.items():
+                task = _ProbeTask(name, probe)
+                task.setAutoDelete(False)
+                task.signals.finished.connect(self._probe_finished)
+                self._probe_tasks.append(task)
+                QThreadPool.globalInstance().start(task)
+
+        # Show the widget
+        self.setVisible(True)
+
+    @staticmethod
+    def _cached_cameras() -> list[CameraObject] | None:
+        """Get the cameras found by a recent probe, if there was one"""
+        cache = CameraSelection._probe_cache
+        if cache is not None and time.monotonic() - cache[0] < _PROBE_TTL:
+            return list(cache[1])
+        return None
+
+    @staticmethod
+    def _cache_cameras(cams: list[CameraObject]) -> None:
+        CameraSelection._probe_cache = (time.monotonic(), list(cams))
+
+    def available_cameras(self) -> list[CameraObject]:
+        """Find the available cameras (blocking), reusing a recent probe if there was one."""
+        cams = self._cached_cameras()
+        if cams is None:
+            cams = [cam for probe in _CAMERA_PROBES.values() for cam in probe()]
+            self._cache_cameras(cams)
+        return cams
+
+    @pyqtSlot(str, list)
+    def _probe_finished(self, name: str, cams: list[CameraObject]) -> None:
+        """Show the cameras once every camera type has been probed"""
+        self._probe_results[name] = cams
+        if len(self._probe_results) < len(_CAMERA_PROBES):
+            return
+        cams = [cam for kind in _CAMERA_PROBES for cam in self._probe_results[kind]]
+        self._probe_tasks.clear()
+        self._cache_cameras(cams)
+        self._add_camera_buttons(cams)
+
+    def _add_camera_buttons(self, cams: list[CameraObject]) -> None:
+        layout = self.layout()
+
         # If there are no cameras, no buttons need to be added
         if not cams:
-            btn = QPushButton("No cameras found")
-            btn.setEnabled(False)
-            layout.addWidget(btn, 0, 0)
+            self._status_button.setText("No cameras found")
+            return
 
-        # Create buttons for each camera
+        # Replace the placeholder with buttons for each camera
+        layout.removeWidget(self._status_button)
+        self._status_button.deleteLater()
         for i, cam in enumerate(cams):
             # Create the button
             btn = QPushButton(cam.name)
 
             # Connect signal
-            # Doing it this way is necessary because otherwise all lambda
-            # functions will initialize the same camera
-            def make_lambda(cam_obj: CameraObject) -> Callable[[], FlirCamera | UsbCamera]:
-                return lambda: self.select_camera(cam_obj)
-
-            btn.clicked.connect(make_lambda(cam))
+            # The camera is bound as a default argument, otherwise all of the lambda
+            # functions would initialize the last camera ('checked' absorbs the click argument)
+            btn.clicked.connect(lambda checked=False, cam=cam: self.select_camera(cam))
 
             # Add button to layout
             layout.addWidget(btn, i, 0)
 
-        # Show the widget
-        self.setVisible(True)
-
-    def available_cameras(self) -> list[CameraObject]:
-        # Check each camera class for availability
-        usb_cams = [CameraObject(UsbCamera, src, name) for src, name in get_usb_cams().items()]
-        flir_cams = [CameraObject(FlirCamera, src, name) for src, name in get_flir_cams().items()]
-        return usb_cams + flir_cams
-
     def select_camera(self, cam: CameraObject) -> FlirCamera | UsbCamera:
         """Get the selected camera class object."""
         # Deselect existing camera